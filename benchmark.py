@@ -0,0 +1,45 @@
+import argparse
+import json
+import os
+import sys
+
+from core.benchmark import SOLVERS, compare, run_benchmark
+
+
+RESOURCES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "resources")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run a CVRP solver over vrplib instance directories.")
+    parser.add_argument("--solver", choices=sorted(SOLVERS), default="alns")
+    parser.add_argument("--paths", nargs="+", default=[os.path.join(RESOURCES, task_type) for task_type in "ABE"])
+    parser.add_argument("--pattern", default="*.vrp")
+    parser.add_argument("--params", type=json.loads, default=None, help="JSON object overriding solver params")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--baseline", default=None, help="report to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    parser.add_argument("--gap-tolerance", type=float, default=0.005)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = run_benchmark(args.solver, args.paths, args.params, args.repeats, args.seed, args.workers, args.pattern)
+
+    if args.baseline is not None:
+        with open(args.baseline) as fp:
+            report["regressions"] = compare(report, json.load(fp), args.tolerance, args.gap_tolerance)
+
+    with open(args.output, "w") as fp:
+        json.dump(report, fp, indent=4)
+
+    summary = report["summary"]
+    print(f"{summary['runs']} runs, mean gap = {summary['mean_gap']}, mean time = {summary['mean_time']}, "
+          f"iterations/s = {summary['iterations_per_second']}, scaling = {report['scaling']}")
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION {regression['instance']} {regression['metric']}: "
+              f"{regression['baseline']} -> {regression['current']}")
+    sys.exit(1 if report.get("regressions") else 0)
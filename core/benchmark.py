@@ -0,0 +1,207 @@
+import glob
+import multiprocessing as mp
+import os
+import platform
+import resource
+import time
+
+import numpy as np
+
+from core.cvrp import get_solution
+from core.cvrp_alns import CVRPALNS
+from core.cvrp_ants import AntsSimulator
+from core.instrumentation import Recorder
+from core.parallel import task_seed
+from vrp_io.cache import load_instance
+
+
+TARGET_GAPS = (0.05, 0.02, 0.01)
+
+DEFAULT_PARAMS = {
+    "alns": {
+        "accept_start_gap": 0.02,
+        "accept_end_gap": 0.0,
+        "accept_num_iters": 6000,
+        "stop_max_iterations": 2500,
+        "max_runtime": 30,
+    },
+    "ants": {
+        "alpha": 0.8,
+        "beta": 0.5,
+        "rho": 0.9,
+        "Q": 100,
+        "q_0": 0.0,
+        "k": 100,
+        "start_pheromone": 1.0,
+        "max_iterations": 200,
+        "n_steps_without_up": 10,
+        "construction": "batched",
+    },
+}
+
+
+def benchmark_alns(data, params, seed, recorder):
+    np.random.seed(seed)
+    solution = CVRPALNS(**params)(data, recorder=recorder)
+    return solution.cost
+
+
+def benchmark_ants(data, params, seed, recorder):
+    sim = AntsSimulator(dict(params, seed=seed))
+    _, cost, _ = sim.simulate(data, recorder=recorder)
+    return cost
+
+
+SOLVERS = {"alns": benchmark_alns, "ants": benchmark_ants}
+
+
+def time_to_target(recorder, optimal, setup_time):
+    n = recorder.n_iterations
+    times = {}
+    for gap in TARGET_GAPS:
+        reached = np.flatnonzero(recorder.best_cost[:n] <= optimal * (1 + gap))
+        times[str(gap)] = setup_time + float(recorder.elapsed[reached[0]]) if len(reached) else None
+    return times
+
+
+def run_instance(solver, params, path, seed):
+    sol_path = path.rsplit(".", 1)[0] + ".sol"
+    optimal = get_solution(sol_path).cost if os.path.exists(sol_path) else None
+    # reference costs are priced on TSPLIB EUC_2D nint distances, so tours are priced the same way,
+    # explicit edge weight sections are used as they are
+    data = load_instance(path, rounding=True)
+
+    recorder = Recorder()
+    start = time.perf_counter()
+    cost = float(SOLVERS[solver](data, params, seed, recorder))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "name": os.path.basename(path).rsplit(".", 1)[0],
+        "dimension": int(data["dimension"]),
+        "seed": seed,
+        "optimal": optimal,
+        "cost": cost,
+        "gap": (cost - optimal) / optimal if optimal else None,
+        "time": elapsed,
+        "iterations": recorder.n_iterations,
+        "iterations_per_second": recorder.n_iterations / elapsed if elapsed > 0 else 0.0,
+        "time_to_target": time_to_target(recorder, optimal, recorder.started - start) if optimal else None,
+        # kilobytes on Linux, the worker runs a single instance so this is the peak of that run
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def scaling_fit(runs):
+    # T(N) = c * N ^ b, fitted on the mean time of every dimension in log-log space
+    dimensions = sorted({run["dimension"] for run in runs})
+    if len(dimensions) < 2:
+        return None
+
+    times = [np.mean([run["time"] for run in runs if run["dimension"] == dimension]) for dimension in dimensions]
+    log_n, log_t = np.log(dimensions), np.log(times)
+    exponent, intercept = np.polyfit(log_n, log_t, 1)
+    residuals = log_t - (exponent * log_n + intercept)
+    total = np.sum((log_t - log_t.mean()) ** 2)
+    return {
+        "exponent": float(exponent),
+        "coefficient": float(np.exp(intercept)),
+        "r2": float(1 - np.sum(residuals ** 2) / total) if total > 0 else 1.0,
+    }
+
+
+def target_summary(runs):
+    summary = {}
+    for gap in map(str, TARGET_GAPS):
+        times = sorted(run["time_to_target"][gap] for run in runs
+                       if run["time_to_target"] is not None and run["time_to_target"][gap] is not None)
+        summary[gap] = {
+            "success_rate": len(times) / len(runs),
+            "median": float(np.median(times)) if times else None,
+            # empirical distribution, the share of all runs that reached the target by each time
+            "curve": [[t, (idx + 1) / len(runs)] for idx, t in enumerate(times)],
+        }
+    return summary
+
+
+def summarize(runs):
+    gaps = [run["gap"] for run in runs if run["gap"] is not None]
+    return {
+        "runs": len(runs),
+        "mean_gap": float(np.mean(gaps)) if gaps else None,
+        "median_gap": float(np.median(gaps)) if gaps else None,
+        "mean_time": float(np.mean([run["time"] for run in runs])),
+        "iterations_per_second": float(np.mean([run["iterations_per_second"] for run in runs])),
+        "peak_rss": max(run["peak_rss"] for run in runs),
+        "time_to_target": target_summary(runs),
+    }
+
+
+def instance_paths(paths, pattern="*.vrp"):
+    return sorted(path for directory in paths for path in glob.glob(os.path.join(directory, pattern)))
+
+
+def run_benchmark(solver, paths, params=None, repeats=3, seed=0, workers=1, pattern="*.vrp"):
+    if solver not in SOLVERS:
+        raise ValueError(f"Unknown solver {solver}, expected one of {tuple(SOLVERS)}")
+    params = dict(DEFAULT_PARAMS[solver], **(params or {}))
+    instances = instance_paths(paths, pattern)
+
+    # a fresh process per run keeps the peak RSS of one run from leaking into the next
+    with mp.Pool(processes=workers, maxtasksperchild=1) as pool:
+        results = [
+            pool.apply_async(run_instance, (solver, params, path, task_seed(seed, instance_idx, repeat)))
+            for instance_idx, path in enumerate(instances) for repeat in range(repeats)
+        ]
+        runs = [result.get() for result in results]
+
+    names = sorted({run["name"] for run in runs})
+    return {
+        "meta": {
+            "solver": solver,
+            "params": params,
+            "paths": list(paths),
+            "repeats": repeats,
+            "seed": seed,
+            "workers": workers,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.platform(),
+        },
+        "summary": summarize(runs),
+        "instances": {name: summarize([run for run in runs if run["name"] == name]) for name in names},
+        "scaling": scaling_fit(runs),
+        "runs": runs,
+    }
+
+
+def compare(report, baseline, tolerance=0.1, gap_tolerance=0.005):
+    regressions = []
+
+    def check(instance, metric, current, previous, worse):
+        if current is not None and previous is not None and worse(current, previous):
+            regressions.append({"instance": instance, "metric": metric, "baseline": previous, "current": current})
+
+    slower = lambda current, previous: current > previous * (1 + tolerance)
+    for name, summary in [("all", report["summary"])] + sorted(report["instances"].items()):
+        previous = baseline["summary"] if name == "all" else baseline["instances"].get(name)
+        if previous is None:
+            continue
+
+        check(name, "mean_gap", summary["mean_gap"], previous["mean_gap"],
+              lambda current, previous: current > previous + gap_tolerance)
+        check(name, "iterations_per_second", summary["iterations_per_second"], previous["iterations_per_second"],
+              lambda current, previous: current < previous * (1 - tolerance))
+        check(name, "peak_rss", summary["peak_rss"], previous["peak_rss"], slower)
+        for gap, targets in summary["time_to_target"].items():
+            previous_targets = previous["time_to_target"].get(gap)
+            if previous_targets is None:
+                continue
+            check(name, f"time_to_target[{gap}].success_rate", targets["success_rate"],
+                  previous_targets["success_rate"], lambda current, previous: current < previous)
+            check(name, f"time_to_target[{gap}].median", targets["median"], previous_targets["median"], slower)
+
+    if report["scaling"] is not None and baseline.get("scaling") is not None:
+        check("all", "scaling.exponent", report["scaling"]["exponent"], baseline["scaling"]["exponent"],
+              lambda current, previous: current > previous + tolerance)
+    return regressions
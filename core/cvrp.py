@@ -2,12 +2,12 @@ import copy
 import time
 from tqdm import tqdm
 from core.primitives import SolutionData, Task
-from core.cvrp_ants import Node, Vehicle, AntsSimulator
+from core.cvrp_ants import AntsSimulator
 
 
-def get_task(vrp_file):
+def get_task(vrp_file, cache=False, rounding=False, distances="dense"):
     t = Task()
-    t.from_file(vrp_file)
+    t.from_file(vrp_file, cache, rounding, distances)
     return t
 
 def get_solution(sol_file):
@@ -24,8 +24,7 @@ def run_ants(task, params):
     best_history = []
     best_solution = []
     for r in range(params["runs"]):
-        print("RUN")
-        history, cost, route = sim.simulate(*sim.from_task(task))
+        history, cost, route = sim.simulate(task.instance)
         if cost < best_run_cost:
             best_run_cost = cost
             best_history = history
@@ -34,6 +33,24 @@ def run_ants(task, params):
     return best_history, best_run_cost, best_solution
 
 
+def iter_run_ants(task, params, deadline=None):
+    sim = AntsSimulator(params)
+
+    start = time.perf_counter()
+    best_run_cost = float("inf")
+    for r in range(params["runs"]):
+        remaining = deadline - (time.perf_counter() - start) if deadline is not None else None
+        if remaining is not None and remaining <= 0:
+            break
+
+        # iterations are counted over all runs, so they keep increasing between runs
+        for incumbent in sim.iter_simulate(task.instance, deadline=remaining):
+            if incumbent.cost < best_run_cost:
+                best_run_cost = incumbent.cost
+                yield incumbent._replace(elapsed=time.perf_counter() - start,
+                                         iteration=r * sim.max_iterations + incumbent.iteration)
+
+
 def params_optimization(task, grid):
 
     params_list = [key for key in reversed(sorted(grid.keys(), key=lambda x: len(grid[x])))]
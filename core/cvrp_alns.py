@@ -1,7 +1,11 @@
+import functools
 import time
 import numpy as np
 
-from core.primitives import CvrpSolutionState
+from core.instrumentation import NullRecorder
+from core.local_search import LocalSearch
+from core.operator_selection import OperatorRegistry
+from core.primitives import CvrpSolutionState, Incumbent, as_instance
 
 
 class CVRPALNS:
@@ -9,7 +13,28 @@ class CVRPALNS:
     MAX_STRING_REMOVALS = 2
     MAX_STRING_SIZE = 12
 
-    def __init__(self, accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime):
+    MIN_REMOVALS = 4
+    MAX_REMOVALS = 30
+    # randomisation of the worst and Shaw removals, higher picks the top ranked customers more often
+    REMOVAL_DETERMINISM = 4
+    # greedy insertion noise relative to the longest edge
+    REPAIR_NOISE = 0.025
+
+    DESTROY_OPERATORS = {
+        "string": "destroy_operator",
+        "random": "random_destroy_operator",
+        "worst": "worst_destroy_operator",
+        "shaw": "shaw_destroy_operator",
+    }
+    # "regret<k>" selects regret-k insertion for any k
+    REPAIR_OPERATORS = {
+        "greedy": "repair_operator",
+        "perturbed": "perturbed_repair_operator",
+    }
+
+    def __init__(self, accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime,
+                 n_neighbors=40, regret_k=None, local_search=False, destroy_operators=None, repair_operators=None,
+                 selection="roulette"):
         self.accept_start_gap = accept_start_gap
         self.accept_end_gap = accept_end_gap
         self.accept_num_iters = accept_num_iters
@@ -17,6 +42,36 @@ class CVRPALNS:
         self.stop_max_iterations = stop_max_iterations
         self.max_runtime = max_runtime
 
+        self.n_neighbors = n_neighbors
+        self.neighbor_index = None
+        # scales of the Shaw relatedness and the repair noise, set once per solve
+        self.max_distance = None
+        self.max_demand = None
+
+        self.regret_k = regret_k
+
+        self.local_search = local_search
+        self.local_searcher = None
+
+        if destroy_operators is None:
+            destroy_operators = ["string"]
+        if repair_operators is None:
+            repair_operators = ["greedy"] if regret_k is None else [f"regret{regret_k}"]
+        self.destroy_operators = {name: self.operator(name, CVRPALNS.DESTROY_OPERATORS) for name in destroy_operators}
+        self.repair_operators = {name: self.operator(name, CVRPALNS.REPAIR_OPERATORS) for name in repair_operators}
+        self.selection = selection
+        self.destroy_registry = None
+        self.repair_registry = None
+        self.recorder = NullRecorder()
+        self.solution_ = None
+
+    def operator(self, name, operators):
+        if name in operators:
+            return getattr(self, operators[name])
+        if operators is CVRPALNS.REPAIR_OPERATORS and name.startswith("regret") and name[len("regret"):].isdigit():
+            return functools.partial(self.regret_repair_operator, k=int(name[len("regret"):]))
+        raise ValueError(f"Unknown operator {name}, expected one of {tuple(operators)}")
+
     def reset(self, init):
         self.start_threshold = self.accept_start_gap * init.cost
         self.end_threshold = self.accept_end_gap * init.cost
@@ -52,7 +107,7 @@ class CVRPALNS:
 
             while unvisited:
                 current = route[-1]
-                nearest = [nb for nb in self.neighbors(data, current) if nb in unvisited][0]
+                nearest = next(nb for nb in self.scan_neighbors(data, current) if nb in unvisited)
 
                 if route_demands + data["demand"][nearest] > data["capacity"]:
                     break
@@ -64,22 +119,35 @@ class CVRPALNS:
             customers = route[1:]
             routes.append(customers)
 
-        return CvrpSolutionState(data['edge_weight'], routes)
+        return CvrpSolutionState(data['edge_weight'], routes, demand=data['demand'])
 
     def neighbors(self, data, customer):
+        if self.neighbor_index is None:
+            return self.all_neighbors(data, customer)
+        return self.neighbor_index[customer]
+
+    def all_neighbors(self, data, customer):
         locations = np.argsort(data["edge_weight"][customer])
         return locations[locations != 0]
 
+    def scan_neighbors(self, data, customer):
+        yield from self.neighbors(data, customer)
+
+        # candidates are exhausted, fall back to a full scan
+        if self.neighbor_index is not None:
+            yield from self.all_neighbors(data, customer)
+
     def destroy_operator(self, data, state):
 
-        def remove_string(route, cust, max_string_size):
+        def remove_string(route_idx, cust, max_string_size):
+            route = destroyed.routes[route_idx]
             size = np.random.randint(1, min(len(route), max_string_size) + 1)
-            start = route.index(cust) - np.random.randint(size)
+            start = destroyed.find_position(cust) - np.random.randint(size)
             idcs = [idx % len(route) for idx in range(start, start + size)]
 
             removed_customers = []
             for idx in sorted(idcs, reverse=True):
-                removed_customers.append(route.pop(idx))
+                removed_customers.append(destroyed.remove(route_idx, idx))
 
             return removed_customers
 
@@ -89,63 +157,176 @@ class CVRPALNS:
         max_string_size = max(CVRPALNS.MAX_STRING_SIZE, avg_route_size)
         max_string_removals = min(len(state.routes), CVRPALNS.MAX_STRING_REMOVALS)
 
-        destroyed_routes = []
+        destroyed_routes = set()
         center = np.random.randint(1, data["dimension"])
 
-        for customer in self.neighbors(data, center):
+        for customer in self.scan_neighbors(data, center):
             if len(destroyed_routes) >= max_string_removals:
                 break
 
-            if customer in destroyed.unassigned:
+            if not destroyed.is_assigned(customer):
                 continue
 
-            route = destroyed.find_route(customer)
-            if route in destroyed_routes:
+            route_idx = destroyed.find_route_idx(customer)
+            if route_idx in destroyed_routes:
                 continue
 
-            customers = remove_string(route, customer, max_string_size)
+            customers = remove_string(route_idx, customer, max_string_size)
             destroyed.unassigned.extend(customers)
-            destroyed_routes.append(route)
+            destroyed_routes.add(route_idx)
 
         return destroyed
 
-    def repair_operator(self, data, state):
+    def n_removals(self, data):
+        n_customers = data["dimension"] - 1
+        return np.random.randint(min(CVRPALNS.MIN_REMOVALS, n_customers), min(CVRPALNS.MAX_REMOVALS, n_customers) + 1)
 
-        def insert_cost(customer, route, idx):
-            dist = data["edge_weight"]
-            pred = 0 if idx == 0 else route[idx - 1]
-            succ = 0 if idx == len(route) else route[idx]
+    def remove_customers(self, destroyed, customers):
+        # back to front within every route, so the positions of the others stay valid
+        for customer in sorted(customers, key=lambda customer: -destroyed.find_position(customer)):
+            destroyed.remove(destroyed.find_route_idx(customer), destroyed.find_position(customer))
+        destroyed.unassigned.extend(customers)
+        return destroyed
 
-            return dist[pred][customer] + dist[customer][succ] - dist[pred][succ]
+    def pick_ranked(self, ranked):
+        # position y^p in the ranking, biased towards the front
+        return ranked[int(np.random.rand() ** CVRPALNS.REMOVAL_DETERMINISM * len(ranked))]
 
-        def can_insert(customer, route):
-            total = data["demand"][route].sum() + data["demand"][customer]
-            return total <= data["capacity"]
+    def random_destroy_operator(self, data, state):
+        destroyed = state.copy()
+        assigned = np.flatnonzero(destroyed.route_of >= 0)
+        customers = np.random.choice(assigned, size=min(self.n_removals(data), len(assigned)), replace=False)
+        return self.remove_customers(destroyed, customers.tolist())
 
-        def best_insert(customer, state):
-            best_cost, best_route, best_idx = None, None, None
+    def worst_destroy_operator(self, data, state):
+        dist = data["edge_weight"]
+        destroyed = state.copy()
+
+        # savings of taking each customer out of its route, computed once for the whole removal
+        customers, savings = [], []
+        for route in destroyed.routes:
+            if not route:
+                continue
+            tour = np.array([0] + route + [0], dtype=int)
+            preds, routed, succs = tour[:-2], tour[1:-1], tour[2:]
+            customers.extend(route)
+            savings.append(dist[preds, routed] + dist[routed, succs] - dist[preds, succs])
+        ranked = [customers[idx] for idx in np.argsort(-np.concatenate(savings), kind="stable")]
+
+        removed = []
+        for _ in range(min(self.n_removals(data), len(ranked))):
+            customer = self.pick_ranked(ranked)
+            ranked.remove(customer)
+            removed.append(customer)
+        return self.remove_customers(destroyed, removed)
+
+    def shaw_destroy_operator(self, data, state):
+        dist = data["edge_weight"]
+        demand = np.asarray(data["demand"], dtype=float)
+        destroyed = state.copy()
 
-            for route in state.routes:
-                for idx in range(len(route) + 1):
+        # relatedness by distance and demand, both scaled to [0, 1], lower is more related
+        max_dist = max(self.max_distance, np.finfo(float).tiny)
+        max_demand = max(self.max_demand, np.finfo(float).tiny)
+
+        assigned = np.flatnonzero(destroyed.route_of >= 0)
+        removed = [int(np.random.choice(assigned))]
+        remaining = assigned[assigned != removed[0]]
+        n_removals = min(self.n_removals(data), len(assigned))
+
+        while len(removed) < n_removals:
+            related = removed[np.random.randint(len(removed))]
+            relatedness = dist[related, remaining] / max_dist + np.abs(demand[related] - demand[remaining]) / max_demand
+            customer = self.pick_ranked(remaining[np.argsort(relatedness, kind="stable")])
+            removed.append(int(customer))
+            remaining = remaining[remaining != customer]
+        return self.remove_customers(destroyed, removed)
+
+    def route_positions(self, route):
+        tour = np.array([0] + route + [0], dtype=int)
+        return tour[:-1], tour[1:]
+
+    def insertion_options(self, data, state, positions, customer):
+        dist = data["edge_weight"]
+        demand = data["demand"][customer]
+        feasible = [route_idx for route_idx, load in enumerate(state.route_loads) if load + demand <= data["capacity"]]
+        if not feasible:
+            return feasible, None, None
+
+        preds = np.concatenate([positions[route_idx][0] for route_idx in feasible])
+        succs = np.concatenate([positions[route_idx][1] for route_idx in feasible])
+        starts = np.cumsum([0] + [len(positions[route_idx][0]) for route_idx in feasible[:-1]])
+
+        # insertion deltas for every position of every feasible route at once
+        deltas = dist[preds, customer] + dist[customer, succs] - dist[preds, succs]
+        return feasible, deltas, starts
+
+    def insert_at(self, state, positions, customer, route_idx, idx):
+        if route_idx is not None:
+            state.insert(customer, route_idx, idx)
+            positions[route_idx] = self.route_positions(state.routes[route_idx])
+        else:
+            state.add_route([customer])
+            positions.append(self.route_positions([customer]))
+
+    def repair_operator(self, data, state, noise=0.0):
 
-                    if can_insert(customer, route):
-                        cost = insert_cost(customer, route, idx)
+        def best_insert(customer, state):
+            feasible, deltas, starts = self.insertion_options(data, state, positions, customer)
+            if not feasible:
+                return None, None
 
-                        if best_cost is None or cost < best_cost:
-                            best_cost, best_route, best_idx = cost, route, idx
+            if noise:
+                deltas = deltas + noise * max_dist * np.random.uniform(-1, 1, len(deltas))
 
-            return best_route, best_idx
+            best = np.argmin(deltas)
+            route_num = np.searchsorted(starts, best, side="right") - 1
+            return feasible[route_num], int(best - starts[route_num])
 
+        max_dist = self.max_distance if noise else 0
+        positions = [self.route_positions(route) for route in state.routes]
         np.random.shuffle(state.unassigned)
 
         while len(state.unassigned) != 0:
             customer = state.unassigned.pop()
-            route, idx = best_insert(customer, state)
+            route_idx, idx = best_insert(customer, state)
+            self.insert_at(state, positions, customer, route_idx, idx)
+
+        return state
+
+    def perturbed_repair_operator(self, data, state):
+        return self.repair_operator(data, state, noise=CVRPALNS.REPAIR_NOISE)
+
+    def regret_repair_operator(self, data, state, k=None):
+        k = self.regret_k if k is None else k
+
+        def regret_insert(customer, state):
+            dist = data["edge_weight"]
+            new_route_cost = dist[0, customer] + dist[customer, 0]
+
+            feasible, deltas, starts = self.insertion_options(data, state, positions, customer)
+            if not feasible:
+                return np.inf, None, None
+
+            route_costs = np.minimum.reduceat(deltas, starts)
+            best_num = np.argmin(route_costs)
+            start = starts[best_num]
+            idx = int(np.argmin(deltas[start:start + len(positions[feasible[best_num]][0])]))
+
+            # a new route stands in for the missing alternatives
+            costs = np.sort(route_costs)[:k]
+            costs = np.concatenate([costs, np.full(k - len(costs), new_route_cost)])
+            return np.sum(costs[1:] - costs[0]), feasible[best_num], idx
 
-            if route is not None:
-                route.insert(idx, customer)
-            else:
-                state.routes.append([customer])
+        positions = [self.route_positions(route) for route in state.routes]
+        np.random.shuffle(state.unassigned)
+
+        while len(state.unassigned) != 0:
+            options = [regret_insert(customer, state) for customer in state.unassigned]
+            chosen = max(range(len(options)), key=lambda option_idx: options[option_idx][0])
+
+            _, route_idx, idx = options[chosen]
+            self.insert_at(state, positions, state.unassigned.pop(chosen), route_idx, idx)
 
         return state
 
@@ -161,17 +342,84 @@ class CVRPALNS:
 
         return best, curr
 
-    def __call__(self, data):
+    def outcome(self, best, curr, new_best, new_curr):
+        if new_best is not best:
+            return "best"
+        if new_curr is not curr:
+            return "improved" if new_curr.cost < curr.cost else "accepted"
+        return "rejected"
+
+    def iteration(self, data, best, curr):
+        recorder = self.recorder
+        destroy_idx = self.destroy_registry.select()
+        repair_idx = self.repair_registry.select()
+
+        started = recorder.clock()
+        destroyed = self.destroy_registry.apply(destroy_idx, data, curr)
+        removed = list(destroyed.unassigned)
+        started = recorder.phase("destroy", started)
+        cand = self.repair_registry.apply(repair_idx, data, destroyed)
+        started = recorder.phase("repair", started)
+        if self.local_searcher is not None:
+            # only around the customers the destroy and repair moved, the rest was searched before
+            active = self.local_searcher.around(curr, removed) | self.local_searcher.around(cand, removed)
+            cand = self.local_searcher.improve_state(cand, active)
+            started = recorder.phase("local_search", started)
+        new_best, new_curr = self.eval(best, curr, cand)
+
+        outcome = self.outcome(best, curr, new_best, new_curr)
+        self.destroy_registry.update(destroy_idx, outcome)
+        self.repair_registry.update(repair_idx, outcome)
+        recorder.phase("evaluation", started)
+        recorder.iteration(new_best.cost, new_curr.cost, new_curr is cand)
+        return new_best, new_curr
+
+    def operator_stats(self):
+        return {"destroy": self.destroy_registry.stats(), "repair": self.repair_registry.stats()}
+
+    def make_incumbent(self, best, iteration):
+        return Incumbent(best.cost, [list(route) for route in best.routes if route],
+                         time.perf_counter() - self._start_runtime, iteration)
+
+    def iter_solve(self, data, recorder=None, deadline=None):
+        data = as_instance(data)
+        self.recorder = recorder if recorder is not None else NullRecorder()
+        self.max_distance = data.distance.max()
+        self.max_demand = float(np.max(data.demand))
+        # None keeps the full scans over every customer
+        self.neighbor_index = data.neighbors(self.n_neighbors) if self.n_neighbors is not None else None
+        if self.local_search:
+            neighbors = self.neighbor_index
+            if neighbors is None:
+                neighbors = data.neighbors(LocalSearch.N_NEIGHBORS)
+            self.local_searcher = LocalSearch(data.distance, data.demand, data.capacity, neighbors)
+        self.destroy_registry = OperatorRegistry(self.destroy_operators, self.selection)
+        self.repair_registry = OperatorRegistry(self.repair_operators, self.selection)
+
         curr = best = self.nearest_neighbor(data)
         self.reset(curr)
+        self.recorder.start()
 
+        n_iter = 0
+        yield self.make_incumbent(best, n_iter)
         while not self.stop_criterion(best, curr):
-            destroyed = self.destroy_operator(data, curr)
-            cand = self.repair_operator(data, destroyed)
-            best, curr = self.eval(best, curr, cand)
+            if deadline is not None and time.perf_counter() - self._start_runtime > deadline:
+                break
+
+            improved = best
+            best, curr = self.iteration(data, best, curr)
+            n_iter += 1
+            if best is not improved:
+                yield self.make_incumbent(best, n_iter)
 
         best.set_time(time.perf_counter() - self._start_runtime)
-        return best
+        best.set_operator_stats(self.operator_stats())
+        self.solution_ = best
+
+    def __call__(self, data, recorder=None):
+        for _ in self.iter_solve(data, recorder):
+            pass
+        return self.solution_
 
 
 def custom_alns_solver(data):
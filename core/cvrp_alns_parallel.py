@@ -0,0 +1,144 @@
+import multiprocessing as mp
+import os
+import queue
+import time
+
+import numpy as np
+
+from core.cvrp_alns import CVRPALNS
+from core.operator_selection import merge_stats
+from core.parallel import task_seed
+from core.primitives import CvrpSolutionState
+
+
+class SharedIncumbent:
+    def __init__(self, ctx, dimension):
+        self.lock = ctx.Lock()
+        self.cost = ctx.Value("d", float("inf"), lock=False)
+        # giant tour, routes separated by the depot and terminated by -1
+        self.tour = ctx.Array("i", 2 * dimension + 1, lock=False)
+
+    def publish(self, state):
+        with self.lock:
+            if state.cost >= self.cost.value:
+                return False
+            tour = [customer for route in state.routes for customer in list(route) + [0]] + [-1]
+            self.tour[:len(tour)] = tour
+            self.cost.value = state.cost
+            return True
+
+    def load(self, data):
+        with self.lock:
+            tour = np.array(self.tour[:])
+        tour = tour[:np.flatnonzero(tour == -1)[0]]
+        routes = [route.tolist() for route in np.split(tour, np.flatnonzero(tour == 0))]
+        routes = [route[1:] if route and route[0] == 0 else route for route in routes][:-1]
+        return CvrpSolutionState(data["edge_weight"], routes, demand=data["demand"])
+
+
+class SharedCVRPALNS(CVRPALNS):
+
+    def __init__(self, accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime,
+                 incumbent, restart_interval, **kwargs):
+        super().__init__(accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime,
+                         **kwargs)
+        self.incumbent = incumbent
+        self.restart_interval = restart_interval
+        self._iteration = 0
+
+    def global_cost(self, best):
+        return min(best.cost, self.incumbent.cost.value)
+
+    def stop_criterion(self, best, curr):
+        target = self.global_cost(best)
+        if self._target is None or target < self._target:
+            self._target = target
+            self._counter = 0
+        else:
+            self._counter += 1
+
+        return self._counter >= self.stop_max_iterations or \
+            time.perf_counter() - self._start_runtime > self.max_runtime
+
+    def accept(self, best, curr, cand):
+        self.threshold_ = max(self.end_threshold, self.threshold_ - self.step)
+        return cand.cost - self.global_cost(best) <= self.threshold_
+
+    def iteration(self, data, best, curr):
+        improved = best
+        best, curr = super().iteration(data, best, curr)
+        if best is not improved or self._iteration == 0:
+            self.incumbent.publish(best)
+
+        # restart from the global best when another worker is ahead
+        self._iteration += 1
+        if self._iteration % self.restart_interval == 0 and self.incumbent.cost.value < curr.cost:
+            curr = self.incumbent.load(data)
+            if curr.cost < best.cost:
+                best = curr
+        return best, curr
+
+
+def alns_worker(worker_idx, data, args, kwargs, seed, incumbent, restart_interval, results):
+    np.random.seed(seed)
+    alns = SharedCVRPALNS(*args, incumbent=incumbent, restart_interval=restart_interval, **kwargs)
+    solution = alns(data)
+    results.put((worker_idx, solution.cost, solution.routes, solution.get_operator_stats()))
+
+
+class ParallelCVRPALNS:
+
+    def __init__(self, accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime,
+                 n_workers=None, restart_interval=250, seed=0, **kwargs):
+        self.args = (accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime)
+        self.kwargs = kwargs
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.restart_interval = restart_interval
+        self.seed = seed
+
+    def __call__(self, data):
+        start_runtime = time.perf_counter()
+
+        ctx = mp.get_context()
+        incumbent = SharedIncumbent(ctx, data["dimension"])
+        results = ctx.Queue()
+        processes = [
+            ctx.Process(target=alns_worker, name=f"alns-{worker_idx}", args=(
+                worker_idx, data, self.args, self.kwargs, task_seed(self.seed, worker_idx), incumbent,
+                self.restart_interval, results))
+            for worker_idx in range(self.n_workers)
+        ]
+
+        try:
+            for process in processes:
+                process.start()
+
+            solutions = []
+            while len(solutions) < self.n_workers:
+                try:
+                    solutions.append(results.get(timeout=1.0))
+                except queue.Empty:
+                    failed = [process for process in processes if process.exitcode not in (None, 0)]
+                    if failed:
+                        raise RuntimeError(f"ALNS process {failed[0].name} exited with code {failed[0].exitcode}")
+            for process in processes:
+                process.join()
+        finally:
+            for process in processes:
+                if process.is_alive():
+                    process.terminate()
+
+        _, _, routes, _ = min(solutions, key=lambda solution: (solution[1], solution[0]))
+        best = CvrpSolutionState(data["edge_weight"], routes, demand=data["demand"])
+        best.set_time(time.perf_counter() - start_runtime)
+        best.set_operator_stats({
+            kind: merge_stats([solution[3][kind] for solution in solutions]) for kind in ("destroy", "repair")
+        })
+        return best
+
+
+def parallel_alns_solver(data):
+
+    alns = ParallelCVRPALNS(0.02, 0.0, 6000, 2500, 30)
+    solution = alns(data)
+    return solution
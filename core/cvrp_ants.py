@@ -1,24 +1,31 @@
 import copy
+import time
 import numpy as np
 
+from core.distances import dense
+from core.instrumentation import NullRecorder
+from core.local_search import LocalSearch
+from core.pheromone import SparsePheromone
+from core.primitives import Incumbent, as_instance
 
-class Node:
-    def __init__(self, x, y, demand):
-        self.x = x
-        self.y = y
-        self.demand = demand
 
-class Vehicle:
-    def __init__(self, capacity):
-        self.capacity = capacity
-
-def distance(node1, node2):
-    return ((node1.x - node2.x) ** 2 + (node1.y - node2.y) ** 2) ** 0.5
+def route_edges(routes):
+    xs = [route[idx - 1] for route in routes for idx in range(1, len(route))]
+    ys = [route[idx] for route in routes for idx in range(1, len(route))]
+    return np.array(xs, dtype=int), np.array(ys, dtype=int)
 
+def tour_routes(tour):
+    depots = np.flatnonzero(tour == 0)
+    return [[0] + tour[start + 1:end].tolist() + [0] for start, end in zip(depots[:-1], depots[1:]) if end - start > 1]
 
 
 class AntsSimulator:
 
+    CONSTRUCTIONS = ("loop", "vectorized", "batched")
+    PHEROMONES = ("dense", "sparse")
+    # floor for feasible nodes, zero distances would otherwise leave nothing to sample
+    MIN_ATTRACTIVENESS = np.finfo(float).tiny
+
     def __init__(self, params):
         self.alpha = params["alpha"]
         self.beta = params["beta"]
@@ -29,97 +36,235 @@ class AntsSimulator:
         self.start_pheromone = params["start_pheromone"]
         self.max_iterations = params["max_iterations"]
         self.n_steps_without_up = params["n_steps_without_up"]
-
-    def compute_distances(self, nodes):
-        distance_matr = np.zeros((len(nodes), len(nodes)))
-        for l_i, node_l in enumerate(nodes):
-            for r_i, node_r in enumerate(nodes):
-                distance_matr[l_i][r_i] = distance(node_l, node_r)
-        return distance_matr
+        self.construction = params.get("construction", "vectorized")
+        self.n_neighbors = params.get("n_neighbors")
+        self.local_search = params.get("local_search", False)
+        self.pheromone = params.get("pheromone", "dense")
+        self.rng = np.random.default_rng(params.get("seed"))
+
+        if self.construction not in AntsSimulator.CONSTRUCTIONS:
+            raise ValueError(f"Unknown construction {self.construction}, expected one of {AntsSimulator.CONSTRUCTIONS}")
+        if self.pheromone not in AntsSimulator.PHEROMONES:
+            raise ValueError(f"Unknown pheromone {self.pheromone}, expected one of {AntsSimulator.PHEROMONES}")
+        if self.pheromone == "sparse" and (self.construction != "batched" or self.n_neighbors is None):
+            raise ValueError("Sparse pheromone needs the batched construction and n_neighbors")
 
     def compute_cost(self, route, distances):
         s = 0
         for i in range(1, len(route)):
-            s += distances[route[i - 1]][route[i]]
+            s += distances[route[i - 1], route[i]]
         return s
 
-    def from_task(self, task):
-        nodes = [Node(value[1], key, value[2]) for key, value in task.nodes.items()]
-        vehicles = [Vehicle(task.capacity) for _ in range(task.n_vehicles)]
-        return nodes, vehicles
-
-    def simulate(self, nodes, vehicles):
-
-        history = []
-
-        n_nodes = len(nodes)
-        n_vehicles = len(vehicles)
-        capacity_ = vehicles[0].capacity
-        pheromone_matrix = np.full((len(nodes), len(nodes)), self.start_pheromone)
-        distance_matrix = self.compute_distances(nodes)
-        demands_ = np.array([node.demand for node in nodes])
-
-        best_cost = float("inf")
-        best_routes = []
-
-        step = 0
-        for n_iter in range(self.max_iterations):
-
-            vertexes_visited_ants_idx = [[[] for i in range(n_nodes)] for j in range(n_nodes)]
-            ants_costs = np.zeros((self.k))
-            best_local_cost = float("inf")
-            best_local_routes = []
+    def choose_next(self, probas):
+        probas /= probas.sum()
+
+        if self.rng.random() < self.q_0:
+            return np.argmax(probas)
+
+        cdf = np.cumsum(probas)
+        cdf /= cdf[-1]
+        return cdf.searchsorted(self.rng.random(), side="right")
+
+    def loop_probas(self, pheromone_matrix, distance_matrix, current_node_idx, demands, capacity):
+        probas = np.zeros(len(demands))
+        for node_idx in range(1, len(demands)):
+
+            if demands[node_idx] == 0 or demands[node_idx] > capacity:
+                continue
+            num = pheromone_matrix[current_node_idx][node_idx] ** self.alpha
+            denum = (1.0 / distance_matrix[current_node_idx, node_idx]) ** self.beta
+            probas[node_idx] = max(num / denum, AntsSimulator.MIN_ATTRACTIVENESS)
+        return probas
+
+    def vectorized_probas(self, attractiveness, current_node_idx, demands, capacity):
+        feasible = np.logical_and(demands != 0, demands <= capacity)
+        feasible[0] = False
+        return np.where(feasible, np.maximum(attractiveness[current_node_idx], AntsSimulator.MIN_ATTRACTIVENESS), 0.0)
+
+    def candidate_probas(self, attractiveness, neighbors, current_node_idx, demands, capacity):
+        candidates = neighbors[current_node_idx]
+        feasible = np.logical_and(demands[candidates] != 0, demands[candidates] <= capacity)
+        if not feasible.any():
+            return np.arange(len(demands)), self.vectorized_probas(attractiveness, current_node_idx, demands, capacity)
+        attractiveness = np.maximum(attractiveness[current_node_idx, candidates], AntsSimulator.MIN_ATTRACTIVENESS)
+        return candidates, np.where(feasible, attractiveness, 0.0)
+
+    def choose_next_batched(self, probas):
+        cdf = np.cumsum(probas, axis=1)
+        totals = cdf[:, -1:]
+        cdf /= np.where(totals > 0, totals, 1.0)
+
+        sampled = (cdf <= self.rng.random(len(probas))[:, None]).sum(axis=1)
+        exploit = self.rng.random(len(probas)) < self.q_0
+        return np.where(exploit, np.argmax(probas, axis=1), sampled)
+
+    def construct_batched(self, candidate_attractiveness, row_attractiveness, neighbors, demands_, capacity_):
+        n_nodes = len(demands_)
+        max_len = 2 * n_nodes
+        ants = np.arange(self.k)
+
+        tours = np.zeros((self.k, max_len), dtype=int)
+        demands = np.tile(demands_, (self.k, 1))
+        demands[:, 0] = 0
+        capacity = np.full(self.k, capacity_)
+        current = np.zeros(self.k, dtype=int)
+
+        for pos in range(1, max_len):
+            next_nodes = np.zeros(self.k, dtype=int)
+            fallback = ants
+
+            if neighbors is not None:
+                candidates = neighbors[current]
+                candidate_demands = demands[ants[:, None], candidates]
+                feasible = np.logical_and(candidate_demands != 0, candidate_demands <= capacity[:, None])
+                has_candidate = feasible.any(axis=1)
+
+                rows = ants[has_candidate]
+                if len(rows):
+                    probas = np.where(feasible[rows], candidate_attractiveness[current[rows]], 0.0)
+                    next_nodes[rows] = candidates[rows, self.choose_next_batched(probas)]
+                fallback = ants[~has_candidate]
+
+            # full scan, ants without a feasible customer go back to the depot
+            if len(fallback):
+                feasible = np.logical_and(demands[fallback] != 0, demands[fallback] <= capacity[fallback, None])
+                movable = feasible.any(axis=1)
+                probas = np.where(feasible, row_attractiveness(current[fallback]), 0.0)
+                next_nodes[fallback] = np.where(movable, self.choose_next_batched(probas), 0)
+
+            if not next_nodes.any() and not current.any():
+                break
+
+            tours[:, pos] = next_nodes
+            capacity -= demands[ants, next_nodes]
+            demands[ants, next_nodes] = 0
+            capacity[next_nodes == 0] = capacity_
+            current = next_nodes
+
+        return tours
+
+    def construct_routes(self, probas_fn, demands_, capacity_, n_vehicles):
+        n_nodes = len(demands_)
+        routes = []
+        demands = copy.copy(demands_)
+        k_index = 0
+        filled = set([0])
+
+        while len(filled) != n_nodes:
+
+            capacity = capacity_
+            if len(routes) <= k_index:
+                routes.append([0])
+
+            while capacity != 0:
+                if not np.logical_and(demands != 0, demands < capacity).any():
+                    routes.append([0])
+                    break
+
+                current_node_idx = routes[k_index][-1]
+                candidates, probas = probas_fn(current_node_idx, demands, capacity)
+                next_node = candidates[self.choose_next(probas)]
+
+                routes[k_index].append(next_node)
+                capacity -= demands[next_node]
+                demands[next_node] = 0
+                filled.add(next_node)
+
+            if routes[k_index][-1] != 0:
+                routes[k_index].append(0)
+
+            k_index += 1
+            k_index %= n_vehicles
+
+        return routes
+
+    def init_colony(self, instance, recorder=None):
+        return Colony(self, as_instance(instance), recorder)
+
+    def sparse_row_attractiveness(self, colony, rows):
+        with np.errstate(divide="ignore"):
+            eta_beta = (1.0 / dense(colony.distance_matrix[rows])) ** self.beta
+        return np.maximum(colony.pheromone.rows(rows) ** self.alpha / eta_beta, AntsSimulator.MIN_ATTRACTIVENESS)
+
+    def deposit(self, colony, routes, cost):
+        xs, ys = route_edges(routes)
+        if colony.pheromone is not None:
+            index = colony.pheromone.insert(xs, ys)
+            values = colony.pheromone.values
+        else:
+            values, index = colony.pheromone_matrix, (xs, ys)
+        values[index] *= 1 - self.rho
+        np.add.at(values, index, self.rho / cost)
+
+    def iterate(self, colony):
+        pheromone_matrix = colony.pheromone_matrix
+        distance_matrix = colony.distance_matrix
+        eta_beta = colony.eta_beta
+        neighbors = colony.neighbors
+        all_nodes = colony.all_nodes
+        demands_ = colony.demands
+        capacity_ = colony.capacity
+        n_vehicles = colony.n_vehicles
+        recorder = colony.recorder
+        started = recorder.clock()
+
+        ants_costs = np.zeros((self.k))
+        best_local_cost = float("inf")
+        best_local_routes = []
+
+        if self.construction == "batched":
+            if colony.pheromone is not None:
+                # only the n * K candidate edges are scored, full rows are built for fallback ants alone
+                candidate_attractiveness = np.maximum(colony.pheromone.candidate_values ** self.alpha / eta_beta,
+                                                      AntsSimulator.MIN_ATTRACTIVENESS)
+                row_attractiveness = lambda rows: self.sparse_row_attractiveness(colony, rows)
+            else:
+                attractiveness = np.maximum(pheromone_matrix ** self.alpha / eta_beta, AntsSimulator.MIN_ATTRACTIVENESS)
+                candidate_attractiveness = None
+                if neighbors is not None:
+                    candidate_attractiveness = np.take_along_axis(attractiveness, neighbors, axis=1)
+                row_attractiveness = lambda rows: attractiveness[rows]
+            tours = self.construct_batched(candidate_attractiveness, row_attractiveness, neighbors, demands_, capacity_)
+
+            ants_costs = distance_matrix[tours[:, :-1], tours[:, 1:]].sum(axis=1)
+            best_ant = np.argmin(ants_costs)
+            best_local_cost = ants_costs[best_ant]
+            best_local_routes = tour_routes(tours[best_ant])
+            started = recorder.phase("construction", started)
+
+            # local update, equal to applying it ant after ant
+            xs, ys = tours[:, :-1].ravel(), tours[:, 1:].ravel()
+            used = np.logical_or(xs != 0, ys != 0)
+            if colony.pheromone is not None:
+                # edges outside the store keep the default, as if no ant had used them
+                values = colony.pheromone.values
+                slots = colony.pheromone.slots(xs[used], ys[used])
+                counts = np.bincount(slots[slots >= 0], minlength=len(values))
+            else:
+                values = pheromone_matrix
+                counts = np.zeros(pheromone_matrix.shape, dtype=int)
+                np.add.at(counts, (xs[used], ys[used]), 1)
+            touched = counts > 0
+            values[touched] = self.start_pheromone + (1 - self.rho) ** counts[touched] * \
+                (values[touched] - self.start_pheromone)
+            started = recorder.phase("local_update", started)
+
+        else:
+            if self.construction == "vectorized" and neighbors is not None:
+                attractiveness = pheromone_matrix ** self.alpha / eta_beta
+                probas_fn = lambda current, demands, capacity: \
+                    self.candidate_probas(attractiveness, neighbors, current, demands, capacity)
+            elif self.construction == "vectorized":
+                attractiveness = pheromone_matrix ** self.alpha / eta_beta
+                probas_fn = lambda current, demands, capacity: \
+                    (all_nodes, self.vectorized_probas(attractiveness, current, demands, capacity))
+            else:
+                probas_fn = lambda current, demands, capacity: \
+                    (all_nodes, self.loop_probas(pheromone_matrix, distance_matrix, current, demands, capacity))
 
             for ant_idx in range(self.k):
-                routes = []
-                v_costs = np.zeros((len(vehicles)))
-                demands = copy.copy(demands_)
-                k_index = 0
-                filled = set([0])
-
-                while len(filled) != n_nodes:
-
-                    capacity = capacity_
-                    if len(routes) <= k_index:
-                        routes.append([0])
-
-                    while capacity != 0:
-                        if not np.logical_and(demands != 0, demands < capacity).any():
-                            routes.append([0])
-                            break
-
-                        current_node_idx = routes[k_index][-1]
-
-                        probas = np.zeros(n_nodes)
-                        for node_idx in range(1, len(nodes)):
-
-                            if demands[node_idx] == 0 or demands[node_idx] > capacity:
-                                continue
-                            num = pheromone_matrix[current_node_idx][node_idx] ** self.alpha
-                            denum = (1.0 / distance_matrix[current_node_idx][node_idx]) ** self.beta
-                            probas[node_idx] = num / denum
-
-                        probas /= probas.sum()
-
-                        use_choice = np.random.choice([False, True], size=1, p=[self.q_0, 1 - self.q_0])[0]
-                        if use_choice:
-                            next_node = np.random.choice(np.arange(0, n_nodes), size=1, p=probas)[0]
-                        else:
-                            next_node = np.argmax(probas)
-                        vertexes_visited_ants_idx[current_node_idx][next_node].append(ant_idx)
-
-                        routes[k_index].append(next_node)
-                        capacity -= demands[next_node]
-                        if capacity < 0:
-                            print("ERROR")
-                        demands[next_node] = 0
-                        filled.add(next_node)
-
-                    if routes[k_index][-1] != 0:
-                        routes[k_index].append(0)
-
-                    k_index += 1
-                    k_index %= n_vehicles
+                v_costs = np.zeros((n_vehicles))
+                routes = self.construct_routes(probas_fn, demands_, capacity_, n_vehicles)
 
                 for ts_index in range(n_vehicles):
                     v_costs[ts_index] = self.compute_cost(routes[ts_index], distance_matrix)
@@ -130,57 +275,108 @@ class AntsSimulator:
                     best_local_cost = s_cost
 
                 ants_costs[ant_idx] = s_cost
+                started = recorder.phase("construction", started)
 
                 # local update
-                for route in routes:
-                    for idx in range(1, len(route)):
-                        x = route[idx - 1]
-                        y = route[idx]
-                        pheromone_matrix[x][y] = (1 - self.rho) * pheromone_matrix[x][y] + self.rho * self.start_pheromone
-
-            best_vertexes_cost = [[0 for i in range(n_nodes)] for j in range(n_nodes)]
-            for route in best_local_routes:
-                for idx in range(1, len(route)):
-                    best_vertexes_cost[route[idx - 1]][route[idx]] = best_local_cost
-
-            for x in range(n_nodes):
-                for y in range(n_nodes):
-                    s = 0.0
-                    # for ant_idx in vertexes_visited_ants_idx[x][y]:
-                    #     s += self.Q / ants_costs[ant_idx]
-                    s_best = 1.0
-                    if best_vertexes_cost[x][y] != 0:
-                        pheromone_matrix[x][y] = (1 - self.rho) * pheromone_matrix[x][y] + self.rho / best_vertexes_cost[x][y]
-
-            if best_local_cost < best_cost:
-                best_routes = copy.copy(best_local_routes)
-                best_cost = best_local_cost
-                step = 0
-            history.append(best_cost)
-
-            print(f"PH stats: {pheromone_matrix.mean()}, {pheromone_matrix.std()}")
-
-            if step >= self.n_steps_without_up:
-                print("Local minimum out")
-                pheromone_matrix = np.full((len(nodes), len(nodes)), self.start_pheromone)
-
-                best_vertexes_cost = [[0 for i in range(n_nodes)] for j in range(n_nodes)]
-                for route in best_routes:
-                    for idx in range(1, len(route)):
-                        best_vertexes_cost[route[idx - 1]][route[idx]] = best_local_cost
-                for x in range(n_nodes):
-                    for y in range(n_nodes):
-                        s_best = 0.0
-                        if best_vertexes_cost[x][y] != 0:
-                            s_best += best_vertexes_cost[x][y]
-                        pheromone_matrix[x][y] = (1 - self.rho) * pheromone_matrix[x][y] + self.rho * s_best
-
-                step = 0
-                #break
-            step += 1
-
-            print(best_cost)
-
-        return history, best_cost, best_routes
-
-
+                xs, ys = route_edges(routes)
+                pheromone_matrix[xs, ys] = (1 - self.rho) * pheromone_matrix[xs, ys] + self.rho * self.start_pheromone
+
+                if self.construction == "vectorized":
+                    attractiveness[xs, ys] = pheromone_matrix[xs, ys] ** self.alpha / eta_beta[xs, ys]
+                started = recorder.phase("local_update", started)
+
+        # daemon action, the iteration best is improved before it lays pheromone
+        if colony.local_search is not None:
+            best_local_routes = colony.local_search.improve_tours(best_local_routes)
+            best_local_cost = sum(self.compute_cost(route, distance_matrix) for route in best_local_routes)
+            started = recorder.phase("local_search", started)
+
+        # global update on the edges of the iteration best
+        self.deposit(colony, best_local_routes, best_local_cost)
+
+        if best_local_cost < colony.best_cost:
+            colony.best_routes = copy.copy(best_local_routes)
+            colony.best_cost = best_local_cost
+            colony.step = 0
+        colony.history.append(colony.best_cost)
+
+        if colony.step >= self.n_steps_without_up:
+            recorder.count("restarts")
+            xs, ys = route_edges(colony.best_routes)
+            if colony.pheromone is not None:
+                colony.pheromone.reset((1 - self.rho) * self.start_pheromone)
+                index = colony.pheromone.insert(xs, ys)
+                values = colony.pheromone.values
+            else:
+                pheromone_matrix.fill((1 - self.rho) * self.start_pheromone)
+                values, index = pheromone_matrix, (xs, ys)
+            np.add.at(values, index, self.rho * best_local_cost)
+
+            colony.step = 0
+            #break
+        colony.step += 1
+
+        recorder.phase("global_update", started)
+        recorder.iteration(colony.best_cost, best_local_cost)
+
+    def incumbents(self, colony, deadline=None):
+        start = time.perf_counter()
+        colony.recorder.start()
+        for n_iter in range(self.max_iterations):
+            if deadline is not None and time.perf_counter() - start > deadline:
+                break
+
+            best_cost = colony.best_cost
+            self.iterate(colony)
+            if colony.best_cost < best_cost:
+                # customers only, as ALNS reports them, ant tours start and end at the depot and may be empty
+                routes = [[node for node in route if node != 0] for route in colony.best_routes]
+                yield Incumbent(colony.best_cost, [route for route in routes if route], time.perf_counter() - start,
+                                n_iter)
+
+    def iter_simulate(self, instance, recorder=None, deadline=None):
+        colony = self.init_colony(instance, recorder)
+        yield from self.incumbents(colony, deadline)
+
+    def simulate(self, instance, recorder=None):
+        colony = self.init_colony(instance, recorder)
+        for _ in self.incumbents(colony):
+            pass
+
+        return colony.history, colony.best_cost, colony.best_routes
+
+
+class Colony:
+    def __init__(self, sim, instance, recorder=None):
+        self.n_vehicles = instance.n_vehicles
+        self.capacity = instance.capacity
+        self.demands = instance.demand
+        self.distance_matrix = distance_matrix = instance.distance
+
+        self.all_nodes = np.arange(instance.dimension)
+        self.neighbors = None
+        if sim.n_neighbors is not None:
+            self.neighbors = instance.neighbors(sim.n_neighbors)
+
+        # attractiveness is pheromone ** alpha / eta ** beta, same as in loop_probas
+        with np.errstate(divide="ignore"):
+            if sim.pheromone == "sparse":
+                # n * K values in place of n * n, eta is kept for the candidate edges only
+                self.pheromone_matrix = None
+                self.pheromone = SparsePheromone(self.neighbors, sim.start_pheromone)
+                self.eta_beta = (1.0 / distance_matrix[self.all_nodes[:, None], self.neighbors]) ** sim.beta
+            else:
+                self.pheromone_matrix = np.full((instance.dimension, instance.dimension), sim.start_pheromone)
+                self.pheromone = None
+                self.eta_beta = (1.0 / dense(distance_matrix)) ** sim.beta
+
+        self.local_search = None
+        if sim.local_search:
+            neighbors = self.neighbors if self.neighbors is not None else instance.neighbors(LocalSearch.N_NEIGHBORS)
+            self.local_search = LocalSearch(distance_matrix, self.demands, self.capacity, neighbors)
+
+        self.best_cost = float("inf")
+        self.best_routes = []
+        self.history = []
+        self.step = 0
+        self.recorder = recorder if recorder is not None else NullRecorder()
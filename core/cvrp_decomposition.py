@@ -0,0 +1,146 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from core.cvrp_alns import CVRPALNS
+from core.parallel import task_seed
+from core.primitives import CvrpSolutionState, Instance, as_instance
+
+
+DECOMPOSITIONS = ("sweep", "kmeans")
+KMEANS_ITERATIONS = 20
+
+
+def sweep_labels(points, depot, n_parts, weights, offset=0.0):
+    # sectors around the depot with about the same weight each, offset turns the sector borders
+    # by a fraction of a sector
+    angles = np.arctan2(points[:, 1] - depot[1], points[:, 0] - depot[0])
+    order = np.roll(np.argsort(angles, kind="stable"), -int(round(offset * len(points) / n_parts)))
+    # share of the total weight swept before every point
+    swept = (np.cumsum(weights[order]) - weights[order]) / np.sum(weights)
+    labels = np.empty(len(points), dtype=int)
+    labels[order] = np.minimum((swept * n_parts).astype(int), n_parts - 1)
+    return labels
+
+
+def kmeans_labels(points, n_parts, rng, n_iterations=KMEANS_ITERATIONS):
+    centers = points[rng.choice(len(points), n_parts, replace=False)]
+    labels = np.zeros(len(points), dtype=int)
+    for iteration in range(n_iterations):
+        distances = np.hypot(points[:, None, 0] - centers[None, :, 0], points[:, None, 1] - centers[None, :, 1])
+        new_labels = np.argmin(distances, axis=1)
+        if iteration > 0 and np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        for part in range(n_parts):
+            members = points[labels == part]
+            if len(members):
+                centers[part] = members.mean(axis=0)
+    return labels
+
+
+def partition(points, depot, n_parts, method, rng, weights, offset=0.0):
+    n_parts = max(1, min(n_parts, len(points)))
+    if method == "sweep":
+        labels = sweep_labels(points, depot, n_parts, weights, offset)
+    else:
+        labels = kmeans_labels(points, n_parts, rng)
+    return [np.flatnonzero(labels == part) for part in range(n_parts) if np.any(labels == part)]
+
+
+def routes_cost(distance, routes):
+    tours = [np.concatenate([[0], route, [0]]).astype(int) for route in routes]
+    return float(sum(np.sum(distance[tour[:-1], tour[1:]]) for tour in tours))
+
+
+def subproblem(instance, customers, name):
+    # the depot and the customers of one part, distances are looked up in the full instance
+    nodes = np.concatenate([[0], customers])
+    distance = np.asarray(instance.distance[nodes[:, None], nodes[None, :]], dtype=np.float64)
+    coords = instance.coords[nodes] if instance.coords is not None else None
+    return Instance(name, instance.capacity, instance.demand[nodes], distance, coords=coords), nodes
+
+
+def solve_subproblem(instance, nodes, args, kwargs, seed):
+    np.random.seed(seed)
+    solution = CVRPALNS(*args, **kwargs)(instance)
+    return solution.cost, [nodes[route].tolist() for route in solution.routes if route]
+
+
+class DecomposedCVRPALNS:
+
+    def __init__(self, accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime,
+                 cluster_size=150, decomposition="sweep", n_passes=2, n_workers=None, seed=0, **kwargs):
+        if decomposition not in DECOMPOSITIONS:
+            raise ValueError(f"Unknown decomposition {decomposition}, expected one of {DECOMPOSITIONS}")
+
+        # stopping criteria and max_runtime apply to every subproblem, so the work grows with the number of parts
+        self.args = (accept_start_gap, accept_end_gap, accept_num_iters, stop_max_iterations, max_runtime)
+        self.kwargs = kwargs
+        self.cluster_size = cluster_size
+        self.decomposition = decomposition
+        self.n_passes = n_passes
+        self.n_workers = n_workers if n_workers is not None else os.cpu_count()
+        self.seed = seed
+        self.history_ = []
+
+    def solve_parts(self, executor, instance, parts, n_pass):
+        futures = []
+        for part_idx, customers in enumerate(parts):
+            sub_instance, nodes = subproblem(instance, customers, f"{instance.name}-part{part_idx}")
+            futures.append(executor.submit(solve_subproblem, sub_instance, nodes, self.args, self.kwargs,
+                                           task_seed(self.seed, n_pass, part_idx)))
+        return [future.result() for future in futures]
+
+    def route_groups(self, instance, routes, n_pass, rng):
+        # neighbouring routes are grouped by their centroids, the borders move from pass to pass
+        centroids = np.array([instance.coords[route].mean(axis=0) for route in routes])
+        sizes = np.array([len(route) for route in routes], dtype=float)
+        n_groups = int(round(sizes.sum() / self.cluster_size))
+        groups = partition(centroids, instance.coords[0], n_groups, self.decomposition, rng, sizes,
+                           offset=0.5 * (n_pass % 2))
+        return [[routes[route_idx] for route_idx in group] for group in groups]
+
+    def __call__(self, data):
+        start_runtime = time.perf_counter()
+        instance = as_instance(data)
+        if instance.coords is None:
+            raise ValueError("Decomposition needs node coordinates")
+
+        rng = np.random.default_rng(self.seed)
+        self.history_ = []
+        customers = np.arange(1, instance.dimension)
+        coords = instance.coords[customers]
+        n_parts = int(np.ceil(len(customers) / self.cluster_size))
+
+        with ProcessPoolExecutor(max_workers=self.n_workers) as executor:
+            parts = partition(coords, instance.coords[0], n_parts, self.decomposition, rng,
+                              instance.demand[customers].astype(float))
+            results = self.solve_parts(executor, instance, [customers[part] for part in parts], 0)
+            routes = [route for _, part_routes in results for route in part_routes]
+            self.history_.append(routes_cost(instance.distance, routes))
+
+            # re-decomposition, groups of routes across the old borders are solved again and kept when cheaper
+            for n_pass in range(1, self.n_passes + 1):
+                groups = self.route_groups(instance, routes, n_pass, rng)
+                if len(groups) < 2:
+                    break
+                results = self.solve_parts(executor, instance, [np.concatenate(group) for group in groups], n_pass)
+
+                routes = []
+                for group, (cost, group_routes) in zip(groups, results):
+                    routes.extend(group_routes if cost < routes_cost(instance.distance, group) else group)
+                self.history_.append(routes_cost(instance.distance, routes))
+
+        best = CvrpSolutionState(instance.distance, routes, demand=instance.demand)
+        best.set_time(time.perf_counter() - start_runtime)
+        return best
+
+
+def decomposed_alns_solver(data):
+
+    alns = DecomposedCVRPALNS(0.02, 0.0, 6000, 2500, 30)
+    solution = alns(data)
+    return solution
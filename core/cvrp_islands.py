@@ -0,0 +1,150 @@
+import copy
+import math
+import multiprocessing as mp
+import queue
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from core.cvrp_ants import AntsSimulator
+from core.distances import dense
+from core.parallel import task_seed
+from core.primitives import Instance, as_instance
+
+
+TOPOLOGIES = ("ring", "fully_connected")
+EXCHANGES = ("routes", "pheromone")
+
+
+def sources(topology, island, n_islands):
+    if topology == "ring":
+        return [(island - 1) % n_islands]
+    return [other for other in range(n_islands) if other != island]
+
+
+def attach(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def receive(outbox, processes):
+    while True:
+        try:
+            return outbox.get(timeout=1.0)
+        except queue.Empty:
+            failed = [process for process in processes if process.exitcode not in (None, 0)]
+            if failed:
+                raise RuntimeError(f"Island process {failed[0].name} exited with code {failed[0].exitcode}")
+
+
+def island_worker(island, n_islands, params, instance_fields, shape, distance_name, pheromone_name,
+                  migration_interval, topology, exchange, blend, outbox, inbox):
+    distance_shm, distance_matrix = attach(distance_name, shape)
+    name, capacity, demand, n_vehicles = instance_fields
+    instance = Instance(name, capacity, demand, distance_matrix, n_vehicles=n_vehicles)
+    pheromone_shm, slots = None, None
+    if exchange == "pheromone":
+        # two generations of slots, an island one epoch ahead never overwrites what the others still read
+        pheromone_shm, slots = attach(pheromone_name, (2, n_islands) + shape)
+
+    sim = AntsSimulator(dict(params, seed=task_seed(params.get("seed", 0), island)))
+    colony = sim.init_colony(instance)
+
+    n_epochs = math.ceil(sim.max_iterations / migration_interval)
+    for epoch in range(n_epochs):
+        for _ in range(min(migration_interval, sim.max_iterations - epoch * migration_interval)):
+            sim.iterate(colony)
+        if epoch + 1 == n_epochs:
+            break
+
+        if exchange == "pheromone":
+            slots[epoch % 2, island] = colony.pheromone_matrix
+        outbox.put((island, colony.best_cost, colony.best_routes))
+        migrants = inbox.get()
+
+        if exchange == "pheromone":
+            neighbours = slots[epoch % 2, sources(topology, island, n_islands)].mean(axis=0)
+            colony.pheromone_matrix *= 1 - blend
+            colony.pheromone_matrix += blend * neighbours
+
+        for cost, routes in migrants:
+            sim.deposit(colony, routes, cost)
+            if cost < colony.best_cost:
+                colony.best_cost = cost
+                colony.best_routes = copy.copy(routes)
+
+    outbox.put((island, colony.history, colony.best_cost, colony.best_routes))
+
+    del instance, colony, distance_matrix, slots
+    distance_shm.close()
+    if pheromone_shm is not None:
+        pheromone_shm.close()
+
+
+def run_islands(instance, params, n_islands=4, migration_interval=10, topology="ring", exchange="routes",
+                blend=0.5):
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"Unknown topology {topology}, expected one of {TOPOLOGIES}")
+    if exchange not in EXCHANGES:
+        raise ValueError(f"Unknown exchange {exchange}, expected one of {EXCHANGES}")
+    if exchange == "pheromone" and params.get("pheromone", "dense") != "dense":
+        raise ValueError("Pheromone exchange needs the dense pheromone matrix")
+
+    instance = as_instance(instance)
+    distance_matrix = np.asarray(dense(instance.distance), dtype=np.float64)
+    shape = distance_matrix.shape
+
+    # the distance matrix is shared once instead of being pickled to every island
+    distance_shm = shared_memory.SharedMemory(create=True, size=distance_matrix.nbytes)
+    np.ndarray(shape, dtype=np.float64, buffer=distance_shm.buf)[:] = distance_matrix
+    pheromone_shm = None
+    if exchange == "pheromone":
+        pheromone_shm = shared_memory.SharedMemory(create=True, size=2 * n_islands * distance_matrix.nbytes)
+
+    ctx = mp.get_context()
+    outbox = ctx.Queue()
+    inboxes = [ctx.Queue() for _ in range(n_islands)]
+    processes = [
+        ctx.Process(target=island_worker, name=f"island-{island}", args=(
+            island, n_islands, params, (instance.name, instance.capacity, instance.demand, instance.n_vehicles),
+            shape, distance_shm.name,
+            pheromone_shm.name if pheromone_shm is not None else None,
+            migration_interval, topology, exchange, blend, outbox, inboxes[island]))
+        for island in range(n_islands)
+    ]
+
+    try:
+        for process in processes:
+            process.start()
+
+        n_epochs = math.ceil(params["max_iterations"] / migration_interval)
+        for epoch in range(n_epochs - 1):
+            bests = {}
+            for _ in range(n_islands):
+                island, cost, routes = receive(outbox, processes)
+                bests[island] = (cost, routes)
+
+            global_best = min(bests.values(), key=lambda best: best[0])
+            for island in range(n_islands):
+                if topology == "ring":
+                    migrants = [bests[source] for source in sources(topology, island, n_islands)]
+                else:
+                    migrants = [global_best]
+                inboxes[island].put(migrants)
+
+        results = [receive(outbox, processes) for _ in range(n_islands)]
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        distance_shm.close()
+        distance_shm.unlink()
+        if pheromone_shm is not None:
+            pheromone_shm.close()
+            pheromone_shm.unlink()
+
+    _, _, best_cost, best_routes = min(results, key=lambda result: result[2])
+    history = np.min([result[1] for result in results], axis=0).tolist()
+    return history, best_cost, best_routes
@@ -0,0 +1,114 @@
+from collections import OrderedDict
+
+import numpy as np
+
+from core.neighbors import blocked_neighbor_index
+
+
+def compute_distances(coords, out=None, dtype=np.float64, symmetric=False, rounding=False):
+    coords = np.asarray(coords, dtype=dtype)
+    xs, ys = coords[:, 0], coords[:, 1]
+    n_nodes = len(coords)
+
+    if out is None:
+        out = np.empty((n_nodes, n_nodes), dtype=dtype)
+
+    if symmetric:
+        # row by row over the upper triangle, mirrored into the lower one
+        out[np.diag_indices(n_nodes)] = 0
+        for idx in range(n_nodes - 1):
+            np.hypot(xs[idx] - xs[idx + 1:], ys[idx] - ys[idx + 1:], out=out[idx, idx + 1:])
+            out[idx + 1:, idx] = out[idx, idx + 1:]
+    else:
+        np.subtract.outer(xs, xs, out=out)
+        np.hypot(out, np.subtract.outer(ys, ys), out=out)
+
+    # TSPLIB EUC_2D, nint(sqrt(dx^2 + dy^2))
+    if rounding:
+        np.floor(out + 0.5, out=out)
+
+    return out
+
+
+# Solvers index distances like a NumPy matrix and use nothing else: d[i, j], d[rows, cols] element-wise,
+# d[i] for a full row, d.max(), len(d) and d.shape. A dense ndarray is the zero-overhead backend,
+# OnDemandDistances offers the same subset without holding all n * n values.
+
+BACKENDS = ("dense", "dense32", "on_demand")
+
+
+class OnDemandDistances:
+
+    def __init__(self, coords, cache_size=1024, dtype=np.float32, rounding=False):
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.cache_size = cache_size
+        self.dtype = np.dtype(dtype)
+        self.rounding = rounding
+        self.shape = (len(self.coords), len(self.coords))
+        self.rows = OrderedDict()
+
+    def __len__(self):
+        return self.shape[0]
+
+    def pairs(self, rows, cols):
+        d = np.hypot(self.coords[rows, 0] - self.coords[cols, 0], self.coords[rows, 1] - self.coords[cols, 1])
+        if self.rounding:
+            d = np.floor(d + 0.5)
+        return d.astype(self.dtype) if isinstance(d, np.ndarray) else self.dtype.type(d)
+
+    def block(self, start, stop):
+        # rows start..stop against every node, the unit of work when all rows are needed
+        rows = np.arange(start, stop)
+        return self.pairs(rows[:, None], np.arange(len(self))[None, :])
+
+    def row(self, idx):
+        idx = int(idx)
+        if idx in self.rows:
+            self.rows.move_to_end(idx)
+            return self.rows[idx]
+
+        row = self.block(idx, idx + 1)[0]
+        row.flags.writeable = False
+        if self.cache_size > 0:
+            self.rows[idx] = row
+            if len(self.rows) > self.cache_size:
+                self.rows.popitem(last=False)
+        return row
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            if np.ndim(key) == 0:
+                return self.row(key)
+            return np.stack([self.row(idx) for idx in key])
+
+        rows, cols = key
+        if isinstance(rows, slice) or isinstance(cols, slice):
+            if np.ndim(rows) == 0 and not isinstance(rows, slice):
+                return self.row(rows)[cols]
+            return self.dense()[key]
+        return self.pairs(rows, cols)
+
+    def max(self):
+        # the bounding box diagonal, an upper bound that needs no pass over all pairs
+        extent = self.coords.max(axis=0) - self.coords.min(axis=0)
+        return self.dtype.type(np.hypot(*extent))
+
+    def neighbors(self, n_neighbors, chunk_size=256):
+        return blocked_neighbor_index(self.block, len(self), n_neighbors, chunk_size)
+
+    def dense(self):
+        return compute_distances(self.coords, dtype=self.dtype, symmetric=True, rounding=self.rounding)
+
+
+def make_distances(coords, backend="dense", rounding=False, **kwargs):
+    if backend == "dense":
+        return compute_distances(coords, symmetric=True, rounding=rounding)
+    if backend == "dense32":
+        return compute_distances(coords, dtype=np.float32, symmetric=True, rounding=rounding)
+    if backend == "on_demand":
+        return OnDemandDistances(coords, rounding=rounding, **kwargs)
+    raise ValueError(f"Unknown distance backend {backend}, expected one of {BACKENDS}")
+
+
+def dense(distance):
+    return distance if isinstance(distance, np.ndarray) else distance.dense()
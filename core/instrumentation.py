@@ -0,0 +1,137 @@
+import csv
+import json
+import time
+
+import numpy as np
+
+
+PHASES = ("construction", "local_update", "global_update", "local_search", "destroy", "repair", "evaluation")
+PHASE_INDEX = {name: phase_idx for phase_idx, name in enumerate(PHASES)}
+
+
+class NullRecorder:
+
+    enabled = False
+
+    def start(self):
+        pass
+
+    def clock(self):
+        return 0.0
+
+    def phase(self, name, started):
+        return 0.0
+
+    def count(self, name, n=1):
+        pass
+
+    def iteration(self, best_cost, current_cost=np.nan, accepted=None):
+        pass
+
+
+class Recorder(NullRecorder):
+
+    enabled = True
+
+    def __init__(self, capacity=1024, callback=None):
+        self.callback = callback
+        self.n_iterations = 0
+        self.counters = {}
+        self.started = time.perf_counter()
+
+        # per-iteration rows, grown by doubling when a solver runs longer than expected
+        self.timings = np.zeros((capacity, len(PHASES)))
+        self.best_cost = np.full(capacity, np.nan)
+        self.current_cost = np.full(capacity, np.nan)
+        self.accepted = np.full(capacity, -1, dtype=np.int8)
+        self.elapsed = np.zeros(capacity)
+
+    def start(self):
+        self.started = time.perf_counter()
+
+    def clock(self):
+        return time.perf_counter()
+
+    def phase(self, name, started):
+        # adds the time since started to the running iteration and returns the new clock for the next phase
+        now = time.perf_counter()
+        self.timings[self.n_iterations, PHASE_INDEX[name]] += now - started
+        return now
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def grow(self):
+        capacity = 2 * len(self.best_cost)
+        self.timings = np.resize(self.timings, (capacity, len(PHASES)))
+        self.timings[self.n_iterations:] = 0
+        for name, fill in (("best_cost", np.nan), ("current_cost", np.nan), ("accepted", -1), ("elapsed", 0)):
+            values = np.resize(getattr(self, name), capacity)
+            values[self.n_iterations:] = fill
+            setattr(self, name, values)
+
+    def iteration(self, best_cost, current_cost=np.nan, accepted=None):
+        idx = self.n_iterations
+        self.best_cost[idx] = best_cost
+        self.current_cost[idx] = current_cost
+        if accepted is not None:
+            self.accepted[idx] = accepted
+        self.elapsed[idx] = time.perf_counter() - self.started
+
+        self.n_iterations += 1
+        if self.n_iterations == len(self.best_cost):
+            self.grow()
+
+        if self.callback is not None:
+            self.callback(self)
+
+    def used_phases(self):
+        timings = self.timings[:self.n_iterations]
+        return [name for phase_idx, name in enumerate(PHASES) if timings[:, phase_idx].any()]
+
+    def summary(self):
+        n = self.n_iterations
+        accepted = self.accepted[:n]
+        decided = accepted[accepted >= 0]
+        elapsed = float(self.elapsed[n - 1]) if n else 0.0
+        return {
+            "iterations": n,
+            "elapsed": elapsed,
+            "iterations_per_second": n / elapsed if elapsed > 0 else 0.0,
+            "best_cost": float(self.best_cost[n - 1]) if n else None,
+            "acceptance_rate": float(decided.mean()) if len(decided) else None,
+            "phase_time": {name: float(self.timings[:n, PHASE_INDEX[name]].sum()) for name in self.used_phases()},
+            "counters": dict(self.counters),
+        }
+
+    def rows(self):
+        phases = self.used_phases()
+        for idx in range(self.n_iterations):
+            row = {
+                "iteration": idx,
+                "elapsed": float(self.elapsed[idx]),
+                "best_cost": float(self.best_cost[idx]),
+                "current_cost": float(self.current_cost[idx]),
+                "accepted": int(self.accepted[idx]) if self.accepted[idx] >= 0 else None,
+            }
+            row.update({f"{name}_time": float(self.timings[idx, PHASE_INDEX[name]]) for name in phases})
+            yield row
+
+    def to_dict(self):
+        return {"summary": self.summary(), "iterations": list(self.rows())}
+
+    def to_json(self, path):
+        with open(path, "w") as fp:
+            json.dump(self.to_dict(), fp)
+
+    def to_csv(self, path):
+        fields = ["iteration", "elapsed", "best_cost", "current_cost", "accepted"] + \
+            [f"{name}_time" for name in self.used_phases()]
+        with open(path, "w", newline="") as fp:
+            writer = csv.DictWriter(fp, fieldnames=fields)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+
+def print_progress(recorder):
+    print(recorder.best_cost[recorder.n_iterations - 1])
@@ -0,0 +1,230 @@
+import numpy as np
+
+
+class LocalSearch:
+
+    # moves must gain more than this to be applied, guards against cycling on rounding noise
+    EPS = 1e-9
+    # a delta sums up to eight edges, each rounded to the precision of the distance dtype
+    EPS_EDGES = 8
+    N_NEIGHBORS = 20
+    # bound on applied moves per customer when max_moves is not given
+    MAX_MOVES_PER_NODE = 100
+
+    def __init__(self, distance, demand, capacity, neighbors, max_moves=None):
+        self.distance = distance
+        self.demand = demand
+        self.capacity = capacity
+        self.neighbors = neighbors
+        self.max_moves = max_moves if max_moves is not None else LocalSearch.MAX_MOVES_PER_NODE * len(demand)
+
+        # float32 backends round every edge, their noise is far above EPS and would pass for a gain
+        self.eps = LocalSearch.EPS
+        if np.issubdtype(distance.dtype, np.floating):
+            self.eps = max(self.eps, LocalSearch.EPS_EDGES * np.finfo(distance.dtype).eps * float(distance.max()))
+
+    def reindex(self, route_idx):
+        route = self.routes[route_idx]
+        load = 0
+        for position, customer in enumerate(route):
+            load += self.demand[customer]
+            self.route_of[customer] = route_idx
+            self.position_of[customer] = position
+            self.prefix_load[customer] = load
+        self.loads[route_idx] = load
+
+    def pred(self, customer):
+        position = self.position_of[customer]
+        return self.routes[self.route_of[customer]][position - 1] if position > 0 else 0
+
+    def succ(self, customer):
+        route = self.routes[self.route_of[customer]]
+        position = self.position_of[customer]
+        return route[position + 1] if position + 1 < len(route) else 0
+
+    def relocate(self, u, v):
+        # u moves right after v
+        d = self.distance
+        ru, rv = self.route_of[u], self.route_of[v]
+        pu, su, sv = self.pred(u), self.succ(u), self.succ(v)
+        if v == pu or sv == u:
+            return None
+        if ru != rv and self.loads[rv] + self.demand[u] > self.capacity:
+            return None
+
+        delta = d[pu, su] - d[pu, u] - d[u, su] + d[v, u] + d[u, sv] - d[v, sv]
+        if delta > -self.eps:
+            return None
+
+        def apply():
+            self.routes[ru].pop(self.position_of[u])
+            if ru == rv:
+                self.reindex(ru)
+            self.routes[rv].insert(self.position_of[v] + 1, u)
+            return {ru, rv}, [u, v, pu, su, sv]
+        return apply
+
+    def swap(self, u, v):
+        d = self.distance
+        ru, rv = self.route_of[u], self.route_of[v]
+        pu, su, pv, sv = self.pred(u), self.succ(u), self.pred(v), self.succ(v)
+        if ru == rv and (su == v or sv == u):
+            return None
+        if ru != rv and (self.loads[ru] - self.demand[u] + self.demand[v] > self.capacity or
+                         self.loads[rv] - self.demand[v] + self.demand[u] > self.capacity):
+            return None
+
+        delta = d[pu, v] + d[v, su] - d[pu, u] - d[u, su] + d[pv, u] + d[u, sv] - d[pv, v] - d[v, sv]
+        if delta > -self.eps:
+            return None
+
+        def apply():
+            self.routes[ru][self.position_of[u]] = v
+            self.routes[rv][self.position_of[v]] = u
+            return {ru, rv}, [u, v, pu, su, pv, sv]
+        return apply
+
+    def two_opt(self, u, v):
+        # new edge (u, v) inside one route, the segment between them is reversed
+        d = self.distance
+        route_idx = self.route_of[u]
+        if route_idx != self.route_of[v]:
+            return None
+
+        if self.position_of[u] < self.position_of[v]:
+            su, sv = self.succ(u), self.succ(v)
+            delta = d[u, v] + d[su, sv] - d[u, su] - d[v, sv]
+            start, end, touched = self.position_of[u] + 1, self.position_of[v] + 1, [u, v, su, sv]
+        else:
+            pu, pv = self.pred(u), self.pred(v)
+            delta = d[pv, pu] + d[v, u] - d[pv, v] - d[pu, u]
+            start, end, touched = self.position_of[v], self.position_of[u], [u, v, pu, pv]
+        if delta > -self.eps:
+            return None
+
+        def apply():
+            route = self.routes[route_idx]
+            route[start:end] = route[start:end][::-1]
+            return {route_idx}, touched
+        return apply
+
+    def two_opt_star(self, u, v):
+        # new edge (u, v) between two routes, the tails are exchanged
+        d = self.distance
+        ru, rv = self.route_of[u], self.route_of[v]
+        if ru == rv:
+            return None
+        pos_u, pos_v = self.position_of[u], self.position_of[v]
+        pu, su, sv = self.pred(u), self.succ(u), self.succ(v)
+        load_u, load_v = self.prefix_load[u], self.prefix_load[v]
+
+        # A u | B and C v | D become A u v reversed(C) and reversed(B) D
+        if load_u + load_v <= self.capacity and \
+                self.loads[ru] - load_u + self.loads[rv] - load_v <= self.capacity:
+            delta = d[u, v] + d[su, sv] - d[u, su] - d[v, sv]
+            if delta < -self.eps:
+                def apply():
+                    route_u, route_v = self.routes[ru], self.routes[rv]
+                    self.routes[ru] = route_u[:pos_u + 1] + route_v[:pos_v + 1][::-1]
+                    self.routes[rv] = route_u[pos_u + 1:][::-1] + route_v[pos_v + 1:]
+                    return {ru, rv}, [u, v, su, sv]
+                return apply
+
+        # A | u B and C v | D become C v u B and A D
+        before_u = load_u - self.demand[u]
+        if load_v + self.loads[ru] - before_u <= self.capacity and \
+                before_u + self.loads[rv] - load_v <= self.capacity:
+            delta = d[v, u] + d[pu, sv] - d[pu, u] - d[v, sv]
+            if delta < -self.eps:
+                def apply():
+                    route_u, route_v = self.routes[ru], self.routes[rv]
+                    self.routes[ru] = route_v[:pos_v + 1] + route_u[pos_u:]
+                    self.routes[rv] = route_u[:pos_u] + route_v[pos_v + 1:]
+                    return {ru, rv}, [u, v, pu, sv]
+                return apply
+
+        return None
+
+    def index(self, routes):
+        n_nodes = len(self.demand)
+        self.routes = [list(route) for route in routes]
+        self.route_of = np.full(n_nodes, -1)
+        self.position_of = np.full(n_nodes, -1)
+        self.prefix_load = np.zeros(n_nodes, dtype=self.demand.dtype)
+        self.loads = [0] * len(self.routes)
+        for route_idx in range(len(self.routes)):
+            self.reindex(route_idx)
+
+    def index_state(self, state):
+        # positions and loads are taken from the state, only the running loads are filled in
+        self.routes = [list(route) for route in state.routes]
+        self.route_of = state.route_of.astype(int)
+        self.position_of = state.position_of.astype(int)
+        self.prefix_load = np.zeros(len(self.demand), dtype=self.demand.dtype)
+        for route in self.routes:
+            if route:
+                self.prefix_load[route] = np.cumsum(self.demand[route])
+        self.loads = list(state.route_loads)
+
+    def search(self, active):
+        # don't-look bits, only customers next to a recent change are looked at again
+        looking = np.zeros(len(self.demand), dtype=bool)
+        looking[active] = True
+
+        changed = set()
+        n_moves = 0
+        while active and n_moves < self.max_moves:
+            u = active.pop()
+            looking[u] = False
+
+            for v in self.neighbors[u]:
+                if v == u or v == 0 or self.route_of[v] < 0:
+                    continue
+                move = self.relocate(u, v) or self.swap(u, v) or self.two_opt(u, v) or self.two_opt_star(u, v)
+                if move is None:
+                    continue
+
+                routes, touched = move()
+                for route_idx in routes:
+                    self.reindex(route_idx)
+                changed |= routes
+                for customer in touched:
+                    if customer != 0 and not looking[customer]:
+                        looking[customer] = True
+                        active.append(customer)
+                n_moves += 1
+                break
+
+        return changed
+
+    def __call__(self, routes):
+        self.index(routes)
+        self.search([customer for route in self.routes for customer in route])
+        return self.routes
+
+    def around(self, state, customers):
+        # the customers and their neighbours on the route
+        nearby = set()
+        for customer in customers:
+            route, position = state.find_route(customer), state.find_position(customer)
+            nearby.update(route[max(position - 1, 0):position + 2])
+        return nearby
+
+    def improve_state(self, state, active=None):
+        # works on the state in place, only the routes a move changed are written back
+        self.index_state(state)
+        if active is None:
+            active = [customer for route in self.routes for customer in route]
+        for route_idx in self.search(list(active)):
+            state.set_route(route_idx, self.routes[route_idx])
+        return state
+
+    def improve_tours(self, routes):
+        # ACO routes start and end at the depot and may visit it in between
+        trips = [[]]
+        for node in (node for route in routes for node in route):
+            if node == 0:
+                trips.append([])
+            else:
+                trips[-1].append(node)
+        return [[0] + route + [0] for route in self([trip for trip in trips if trip]) if route]
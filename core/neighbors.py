@@ -0,0 +1,23 @@
+import numpy as np
+
+
+def neighbor_index(edge_weight, n_neighbors):
+    # rows may be a block of a larger matrix, candidates are taken over the columns
+    n_nodes = edge_weight.shape[1]
+    n_candidates = min(n_neighbors + 1, n_nodes)
+
+    nearest = np.argpartition(edge_weight, n_candidates - 1, axis=1)[:, :n_candidates]
+    weights = np.take_along_axis(edge_weight, nearest, axis=1)
+
+    # the depot is never a candidate, it takes the extra column if it made the cut
+    weights = np.where(nearest == 0, np.inf, weights)
+    order = np.argsort(weights, axis=1, kind="stable")
+    return np.take_along_axis(nearest, order, axis=1)[:, :min(n_neighbors, n_nodes - 1)]
+
+
+def blocked_neighbor_index(block, n_nodes, n_neighbors, chunk_size=256):
+    # block(start, stop) gives rows start..stop, only chunk_size rows and their temporaries are held at once
+    return np.concatenate([
+        neighbor_index(block(start, min(start + chunk_size, n_nodes)), n_neighbors)
+        for start in range(0, n_nodes, chunk_size)
+    ])
@@ -0,0 +1,118 @@
+import time
+
+import numpy as np
+
+
+SELECTIONS = ("roulette", "bandit")
+OUTCOMES = ("best", "improved", "accepted", "rejected")
+
+
+class OperatorRegistry:
+
+    # Ropke & Pisinger scores for a new global best, an improvement of the current solution and an acceptance
+    SCORES = {"best": 33.0, "improved": 9.0, "accepted": 13.0, "rejected": 0.0}
+    MIN_WEIGHT = 0.05
+
+    def __init__(self, operators, selection="roulette", reaction=0.1, segment_size=100, exploration=0.5):
+        if selection not in SELECTIONS:
+            raise ValueError(f"Unknown selection {selection}, expected one of {SELECTIONS}")
+
+        self.names = list(operators)
+        self.operators = [operators[name] for name in self.names]
+        self.selection = selection
+        self.reaction = reaction
+        self.segment_size = segment_size
+        self.exploration = exploration
+
+        n_operators = len(self.names)
+        self.weights = np.ones(n_operators)
+        self.calls = np.zeros(n_operators, dtype=int)
+        self.time = np.zeros(n_operators)
+        self.score = np.zeros(n_operators)
+        self.outcomes = {outcome: np.zeros(n_operators, dtype=int) for outcome in OUTCOMES}
+
+        self.segment_score = np.zeros(n_operators)
+        self.segment_time = np.zeros(n_operators)
+        self.segment_updates = 0
+
+    def rates(self, score, elapsed):
+        # score per second of CPU time, scaled so that the best operator gets 1
+        rates = score / np.maximum(elapsed, np.finfo(float).tiny)
+        return rates / rates.max() if rates.max() > 0 else rates
+
+    def select(self):
+        if len(self.operators) == 1:
+            return 0
+
+        if self.selection == "roulette":
+            cumulative = np.cumsum(self.weights)
+            return min(int(np.searchsorted(cumulative, np.random.rand() * cumulative[-1], side="right")),
+                       len(self.operators) - 1)
+
+        # UCB1, every operator is tried once before the scores are trusted
+        untried = np.flatnonzero(self.calls == 0)
+        if len(untried):
+            return int(untried[0])
+        bonus = self.exploration * np.sqrt(np.log(self.calls.sum()) / self.calls)
+        return int(np.argmax(self.rates(self.score, self.time) + bonus))
+
+    def apply(self, operator_idx, *args):
+        start = time.process_time()
+        result = self.operators[operator_idx](*args)
+        elapsed = time.process_time() - start
+
+        self.calls[operator_idx] += 1
+        self.time[operator_idx] += elapsed
+        self.segment_time[operator_idx] += elapsed
+        return result
+
+    def update(self, operator_idx, outcome):
+        score = OperatorRegistry.SCORES[outcome]
+        self.outcomes[outcome][operator_idx] += 1
+        self.score[operator_idx] += score
+        self.segment_score[operator_idx] += score
+
+        self.segment_updates += 1
+        if self.segment_updates < self.segment_size:
+            return
+
+        # roulette weights move towards the score per second of the last segment
+        used = self.segment_time > 0
+        rates = self.rates(self.segment_score, self.segment_time)
+        self.weights[used] = (1 - self.reaction) * self.weights[used] + self.reaction * rates[used]
+        np.maximum(self.weights, OperatorRegistry.MIN_WEIGHT, out=self.weights)
+
+        self.segment_score[:] = 0
+        self.segment_time[:] = 0
+        self.segment_updates = 0
+
+    def stats(self):
+        stats = {}
+        for operator_idx, name in enumerate(self.names):
+            stats[name] = {
+                "calls": int(self.calls[operator_idx]),
+                "time": float(self.time[operator_idx]),
+                "weight": float(self.weights[operator_idx]),
+                **{outcome: int(self.outcomes[outcome][operator_idx]) for outcome in OUTCOMES},
+            }
+            stats[name]["success_rate"] = success_rate(stats[name])
+        return stats
+
+
+def success_rate(stats):
+    # share of calls that found a new best or improved the current solution
+    return (stats["best"] + stats["improved"]) / stats["calls"] if stats["calls"] else 0.0
+
+
+def merge_stats(all_stats):
+    merged = {}
+    for stats in all_stats:
+        for name, operator_stats in stats.items():
+            total = merged.setdefault(name, {"calls": 0, "time": 0.0, "weight": 0.0, **dict.fromkeys(OUTCOMES, 0)})
+            for key in ("calls", "time", *OUTCOMES):
+                total[key] += operator_stats[key]
+            total["weight"] += operator_stats["weight"] / len(all_stats)
+
+    for operator_stats in merged.values():
+        operator_stats["success_rate"] = success_rate(operator_stats)
+    return merged
@@ -0,0 +1,101 @@
+import functools
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+from tqdm import tqdm
+
+from core.cvrp import get_solution, get_task
+from core.cvrp_ants import AntsSimulator
+from vrp_io.cache import load_instance
+
+
+def task_seed(seed, *key):
+    return int(np.random.SeedSequence(seed, spawn_key=key).generate_state(1)[0])
+
+
+@functools.lru_cache(maxsize=8)
+def load_task(path, rounding=False, distances="dense"):
+    # a worker process loads every instance once from the mmap cache and keeps it for its next runs
+    return get_task(path, cache=True, rounding=rounding, distances=distances)
+
+
+def task_source(task):
+    # jobs carry where the task comes from instead of the pickled task with its matrices
+    if task.source is None:
+        raise ValueError(f"Task {task.name} has to be read from a file to be solved in worker processes")
+    return task.source
+
+
+def solve_ants(source, params, seed):
+    task = load_task(*source)
+    sim = AntsSimulator(dict(params, seed=seed))
+    start = time.perf_counter_ns()
+    history, cost, route = sim.simulate(task.instance)
+    return history, cost, route, time.perf_counter_ns() - start
+
+
+def solve_alns(solver, task_path, sol_path, seed):
+    np.random.seed(seed)
+    data = load_instance(task_path)
+    sol = solver(data)
+    return {
+        "name": os.path.splitext(os.path.basename(task_path))[0],
+        "optimal": get_solution(sol_path).cost,
+        "time": float(sol.get_time()),
+        "cost": float(sol.cost),
+        "routes": [[int(vert) for vert in route] for route in sol.routes],
+    }
+
+
+def run_ants_parallel(task, params, workers=None):
+    seed = params.get("seed", 0)
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(solve_ants, task_source(task), params, task_seed(seed, run))
+            for run in range(params["runs"])
+        ]
+        results = [future.result() for future in futures]
+
+    best_history, best_run_cost, best_solution, _ = min(results, key=lambda result: result[1])
+    return best_history, best_run_cost, best_solution
+
+
+def run_tasks_parallel(tasks, params, workers=None):
+    seed = params.get("seed", 0)
+    results = [[None] * params["runs"] for _ in tasks]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(solve_ants, task_source(task), params, task_seed(seed, task_idx, run)): (task_idx, run)
+            for task_idx, task in enumerate(tasks) for run in range(params["runs"])
+        }
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            task_idx, run = futures[future]
+            results[task_idx][run] = future.result()
+
+    # same schema as run_tasks, time is the total over all runs of a task
+    return [
+        {"cost": min(result[1] for result in runs), "time": sum(result[3] for result in runs)}
+        for runs in results
+    ]
+
+
+def run_alns_parallel(solver, path, workers=None, seed=0):
+    tasks_path = sorted(glob.glob(os.path.join(path, '*' + ".vrp")))
+    sols_path = sorted(glob.glob(os.path.join(path, '*' + ".sol")))
+
+    history = {os.path.splitext(os.path.basename(task_path))[0]: None for task_path in tasks_path}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(solve_alns, solver, task_path, sol_path, task_seed(seed, task_idx))
+            for task_idx, (task_path, sol_path) in enumerate(zip(tasks_path, sols_path))
+        ]
+        for future in tqdm(as_completed(futures), total=len(futures)):
+            result = future.result()
+            history[result["name"]] = result
+
+    return history
@@ -0,0 +1,78 @@
+import numpy as np
+
+
+class SparsePheromone:
+    # pheromone on the candidate edges of every node plus the edges the best tours added,
+    # every other edge holds the shared default value
+    #
+    # values is one flat array: n * K slots aligned with the neighbour lists, then one slot per
+    # extra edge, with the extra edges kept as sorted keys i * n + j
+
+    def __init__(self, neighbors, start_pheromone, dtype=np.float32):
+        self.neighbors = neighbors
+        self.n_nodes = len(neighbors)
+        self.n_slots = neighbors.size
+        self.default = start_pheromone
+        self.values = np.full(self.n_slots, start_pheromone, dtype=dtype)
+        self.edges = np.empty(0, dtype=np.int64)
+
+    @property
+    def candidate_values(self):
+        return self.values[:self.n_slots].reshape(self.neighbors.shape)
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + self.edges.nbytes
+
+    def slots(self, xs, ys):
+        # index into values for every edge, -1 when the edge is not stored
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        match = self.neighbors[xs] == ys[:, None]
+        slots = np.where(match.any(axis=1), xs * self.neighbors.shape[1] + match.argmax(axis=1), -1)
+
+        missing = np.flatnonzero(slots < 0)
+        if len(missing) and len(self.edges):
+            keys = xs[missing] * self.n_nodes + ys[missing]
+            pos = np.minimum(np.searchsorted(self.edges, keys), len(self.edges) - 1)
+            slots[missing] = np.where(self.edges[pos] == keys, self.n_slots + pos, -1)
+        return slots
+
+    def insert(self, xs, ys):
+        # stores the edges that are not stored yet at the default value and returns the slots of all of them
+        slots = self.slots(xs, ys)
+        missing = slots < 0
+        if not missing.any():
+            return slots
+
+        xs, ys = np.asarray(xs, dtype=np.int64), np.asarray(ys, dtype=np.int64)
+        edges = np.union1d(self.edges, xs[missing] * self.n_nodes + ys[missing])
+        extra = np.full(len(edges), self.default, dtype=self.values.dtype)
+        extra[np.searchsorted(edges, self.edges)] = self.values[self.n_slots:]
+
+        self.edges = edges
+        self.values = np.concatenate([self.values[:self.n_slots], extra])
+        return self.slots(xs, ys)
+
+    def reset(self, value):
+        # every edge back to one value, the extra edges are dropped since they equal the default again
+        self.default = value
+        self.values = self.values[:self.n_slots]
+        self.values.fill(value)
+        self.edges = np.empty(0, dtype=np.int64)
+
+    def rows(self, idx):
+        # dense rows for the few ants that have no feasible candidate left
+        idx = np.asarray(idx, dtype=np.int64)
+        out = np.full((len(idx), self.n_nodes), self.default, dtype=self.values.dtype)
+        out[np.arange(len(idx))[:, None], self.neighbors[idx]] = self.candidate_values[idx]
+
+        starts = np.searchsorted(self.edges, idx * self.n_nodes)
+        counts = np.searchsorted(self.edges, (idx + 1) * self.n_nodes) - starts
+        if counts.any():
+            row_pos = np.repeat(np.arange(len(idx)), counts)
+            pos = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + np.repeat(starts, counts)
+            out[row_pos, self.edges[pos] % self.n_nodes] = self.values[self.n_slots + pos]
+        return out
+
+    def dense(self):
+        return self.rows(np.arange(self.n_nodes))
@@ -1,43 +1,149 @@
 import copy
+from collections import namedtuple
 
 import numpy as np
 
+from core.distances import make_distances
+from core.neighbors import blocked_neighbor_index
+from vrp_io.cache import load_instance
 from vrp_io.reader import read_vrp, read_solution
 
 
+def read_only(array):
+    array = np.asarray(array).view()
+    array.flags.writeable = False
+    return array
+
+
+class Instance:
+    # one CVRP instance as read-only arrays, shared by both solvers and never copied per node
+    __slots__ = ("name", "dimension", "capacity", "n_vehicles", "coords", "demand", "distance", "neighbor_cache")
+
+    # vrplib-style keys, so code written against instance dicts can take an Instance as it is
+    KEYS = {
+        "name": "name",
+        "dimension": "dimension",
+        "capacity": "capacity",
+        "n_vehicles": "n_vehicles",
+        "node_coord": "coords",
+        "demand": "demand",
+        "edge_weight": "distance",
+    }
+
+    def __init__(self, name, capacity, demand, distance, coords=None, n_vehicles=None):
+        self.name = name
+        self.capacity = capacity
+        self.demand = read_only(demand)
+        self.distance = read_only(distance) if isinstance(distance, np.ndarray) else distance
+        self.coords = read_only(coords) if coords is not None else None
+        self.dimension = len(self.demand)
+        self.neighbor_cache = {}
+
+        # the fleet size comes from the "-k" name suffix or, failing that, from the total demand
+        if n_vehicles is None and name.rsplit("-", 1)[-1][:1] == "k" and name.rsplit("-", 1)[-1][1:].isdigit():
+            n_vehicles = int(name.rsplit("-", 1)[1][1:])
+        if n_vehicles is None:
+            n_vehicles = int(np.ceil(np.sum(self.demand) / capacity))
+        self.n_vehicles = n_vehicles
+
+    @classmethod
+    def from_dict(cls, instance: dict):
+        return cls(instance.get("name", ""), instance["capacity"], instance["demand"], instance["edge_weight"],
+                   coords=instance.get("node_coord"), n_vehicles=instance.get("n_vehicles"))
+
+    def neighbors(self, n_neighbors):
+        if n_neighbors not in self.neighbor_cache:
+            if isinstance(self.distance, np.ndarray):
+                neighbors = blocked_neighbor_index(lambda start, stop: self.distance[start:stop], self.dimension,
+                                                   n_neighbors)
+            else:
+                neighbors = self.distance.neighbors(n_neighbors)
+            self.neighbor_cache[n_neighbors] = read_only(neighbors)
+        return self.neighbor_cache[n_neighbors]
+
+    def __getitem__(self, key):
+        value = getattr(self, Instance.KEYS[key])
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return key in Instance.KEYS and getattr(self, Instance.KEYS[key]) is not None
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+
+def as_instance(data):
+    return data if isinstance(data, Instance) else Instance.from_dict(data)
+
+
 class Task:
     def __init__(self):
-        self.nodes = {}
-        self.capacity = float("inf")
-        self.n_vehicles = float("inf")
         self.name = ""
-        self.dimension = ""
-        self.data = None
-        self.node_coord = None
-        self.demand = None
-        self.depot = None
-        self.edge_weight = None
-
-    def compute_distances(self, nodes):
-        def distance(node1, node2):
-            return ((node1[0] - node2[0]) ** 2 + (node1[1] - node2[1]) ** 2) ** 0.5
-        distance_matr = np.zeros((len(nodes), len(nodes)))
-        for idx_l, node_l in enumerate(nodes):
-            for idx_r, node_r in enumerate(nodes):
-                distance_matr[idx_l][idx_r] = distance(node_l, node_r)
-        return distance_matr
-
-    def from_dict(self, task: dict):
-        self.name = task["name"]
-        self.comment = task["comment"]
-        self.dimension = task["dimension"]
-        self.capacity = task["capacity"]
-        self.n_vehicles = int(self.name.rsplit("-", 1)[1][1:])
-        self.node_coord = np.array(task["nodes"])
-        self.demand = np.array([node[1] for node in task["nodes_demand"]])
+        self.comment = ""
         self.depot = np.array([0])
-        self.edge_weight = np.array(self.compute_distances(task['nodes']))
-        self.data = {
+        self.instance = None
+        # (path, rounding, distances) of a task read from a file, worker processes load it again from there
+        self.source = None
+
+    @property
+    def capacity(self):
+        return self.instance.capacity
+
+    @property
+    def n_vehicles(self):
+        return self.instance.n_vehicles
+
+    @property
+    def dimension(self):
+        return self.instance.dimension
+
+    @property
+    def node_coord(self):
+        return self.instance.coords
+
+    @property
+    def demand(self):
+        return self.instance.demand
+
+    @property
+    def edge_weight(self):
+        return self.instance.distance
+
+    @property
+    def data(self):
+        return self.to_dict()
+
+    def compute_distances(self, coords, rounding=False, distances="dense"):
+        return make_distances(coords, distances, rounding)
+
+    def from_dict(self, task: dict, rounding=False, distances="dense"):
+        self.name = task["name"]
+        self.comment = task.get("comment", "")
+        # the reader arrays are used as they are, demand is a view on the demand column
+        coords = task["nodes"][:, 1:] if "nodes" in task else None
+        if "edge_weight" in task:
+            edge_weight = task["edge_weight"]
+        else:
+            edge_weight = self.compute_distances(coords, rounding, distances)
+        self.instance = Instance(self.name, task["capacity"], task["nodes_demand"][:, 1], edge_weight, coords=coords)
+
+    def from_instance(self, instance: dict, rounding=False, distances="dense"):
+        self.name = instance["name"]
+        self.comment = instance.get("comment", "")
+        self.depot = instance.get("depot", self.depot)
+        # cached without a matrix for other backends than the dense one, it is built from the coordinates
+        if "edge_weight" not in instance:
+            coords = instance["node_coord"]
+            self.instance = Instance(self.name, instance["capacity"], instance["demand"],
+                                     self.compute_distances(coords, rounding, distances),
+                                     coords=coords, n_vehicles=instance.get("n_vehicles"))
+        else:
+            self.instance = as_instance(instance)
+
+    def to_dict(self):
+        return {
             "name": self.name,
             "comment": self.comment,
             "dimension": self.dimension,
@@ -49,9 +155,13 @@ class Task:
             "edge_weight": self.edge_weight,
         }
 
-    def from_file(self, path: str):
+    def from_file(self, path: str, cache: bool = False, rounding: bool = False, distances: str = "dense"):
+        self.source = (path, rounding, distances)
+        if cache:
+            self.from_instance(load_instance(path, rounding=rounding, distances=distances), rounding, distances)
+            return
         task_dict = read_vrp(path)
-        self.from_dict(task_dict)
+        self.from_dict(task_dict, rounding, distances)
 
 
 class SolutionData:
@@ -68,12 +178,32 @@ class SolutionData:
         self.from_dict(solution_dict)
 
 
+# a new best solution reported while a solver is still running, routes hold the customers without the depot
+Incumbent = namedtuple("Incumbent", ["cost", "routes", "elapsed", "iteration"])
+
+
 class CvrpSolutionState:
-    def __init__(self, distance, routes, unassigned=None):
+    def __init__(self, distance, routes, unassigned=None, demand=None):
         self.distance = distance
+        self.demand = demand
         self.routes = routes
         self.unassigned = unassigned if unassigned is not None else []
         self.time = None
+        self.operator_stats = None
+
+        # per-route caches, a cost of None means the route changed since it was last priced
+        self.route_costs = [None] * len(routes)
+        self.route_loads = [self.route_load(route) for route in routes] if demand is not None else None
+        self._cost = None
+
+        # customer -> (route index, position in route), -1 for the depot and unassigned customers
+        self.route_of = np.full(len(distance), -1, dtype=np.int32)
+        self.position_of = np.full(len(distance), -1, dtype=np.int32)
+        for route_idx in range(len(routes)):
+            self.reindex(route_idx)
+
+        # copy-on-write, route lists are shared between copies until one of them changes a route
+        self.owned = [True] * len(routes)
 
     def set_time(self, time):
         self.time = time
@@ -81,22 +211,108 @@ class CvrpSolutionState:
     def get_time(self):
         return self.time
 
+    def set_operator_stats(self, operator_stats):
+        self.operator_stats = operator_stats
+
+    def get_operator_stats(self):
+        return self.operator_stats
+
     def copy(self):
-        return CvrpSolutionState(self.distance, copy.deepcopy(self.routes), self.unassigned.copy())
+        self.owned = [False] * len(self.routes)
+
+        state = copy.copy(self)
+        state.routes = self.routes.copy()
+        state.owned = self.owned.copy()
+        state.unassigned = self.unassigned.copy()
+        state.route_costs = self.route_costs.copy()
+        state.route_loads = self.route_loads.copy() if self.route_loads is not None else None
+        state.route_of = self.route_of.copy()
+        state.position_of = self.position_of.copy()
+        return state
 
     def route_cost(self, route):
         tour = [0] + route + [0]
-        return sum(self.distance[tour[idx]][tour[idx + 1]] for idx in range(len(tour) - 1))
+        return sum(self.distance[tour[idx], tour[idx + 1]] for idx in range(len(tour) - 1))
+
+    def route_load(self, route):
+        return sum(self.demand[customer] for customer in route)
+
+    def cached_route_cost(self, route_idx):
+        if self.route_costs[route_idx] is None:
+            self.route_costs[route_idx] = self.route_cost(self.routes[route_idx])
+        return self.route_costs[route_idx]
+
+    def own(self, route_idx):
+        if not self.owned[route_idx]:
+            self.routes[route_idx] = self.routes[route_idx].copy()
+            self.owned[route_idx] = True
+        return self.routes[route_idx]
+
+    def invalidate(self, route_idx):
+        self.route_costs[route_idx] = None
+        self._cost = None
+
+    def reindex(self, route_idx, start=0):
+        tail = self.routes[route_idx][start:]
+        self.route_of[tail] = route_idx
+        self.position_of[tail] = np.arange(start, start + len(tail))
+
+    def insert(self, customer, route_idx, idx):
+        self.own(route_idx).insert(idx, customer)
+        self.reindex(route_idx, idx)
+        self.invalidate(route_idx)
+        if self.route_loads is not None:
+            self.route_loads[route_idx] += self.demand[customer]
+
+    def remove(self, route_idx, idx):
+        customer = self.own(route_idx).pop(idx)
+        self.route_of[customer] = -1
+        self.position_of[customer] = -1
+        self.reindex(route_idx, idx)
+        self.invalidate(route_idx)
+        if self.route_loads is not None:
+            self.route_loads[route_idx] -= self.demand[customer]
+        return customer
+
+    def set_route(self, route_idx, route):
+        self.routes[route_idx] = route
+        self.owned[route_idx] = True
+        self.invalidate(route_idx)
+        if self.route_loads is not None:
+            self.route_loads[route_idx] = self.route_load(route)
+        self.reindex(route_idx)
+
+    def add_route(self, route):
+        self.routes.append(route)
+        self.owned.append(True)
+        self.route_costs.append(None)
+        self._cost = None
+        if self.route_loads is not None:
+            self.route_loads.append(self.route_load(route))
+        self.reindex(len(self.routes) - 1)
+        return len(self.routes) - 1
+
+    def is_assigned(self, customer):
+        return self.route_of[customer] >= 0
+
+    def find_route_idx(self, customer):
+        if not self.is_assigned(customer):
+            raise ValueError(f"Solution does not contain customer {customer}.")
+        return int(self.route_of[customer])
+
+    def find_position(self, customer):
+        if not self.is_assigned(customer):
+            raise ValueError(f"Solution does not contain customer {customer}.")
+        return int(self.position_of[customer])
 
     def find_route(self, customer):
-        for route in self.routes:
-            if customer in route:
-                return route
-        raise ValueError(f"Solution does not contain customer {customer}.")
+        return self.routes[self.find_route_idx(customer)]
 
     def objective(self):
-        return sum(self.route_cost(route) for route in self.routes)
+        return sum(self.cached_route_cost(route_idx) for route_idx in range(len(self.routes)))
 
     @property
     def cost(self):
-        return self.objective()
+        if self._cost is None:
+            self._cost = self.objective()
+        return self._cost
@@ -0,0 +1,265 @@
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import vrplib
+
+from core.benchmark import DEFAULT_PARAMS
+from core.cvrp_alns import CVRPALNS
+from core.cvrp_ants import AntsSimulator
+from core.distances import compute_distances
+from core.primitives import as_instance
+
+
+SOLVERS = ("alns", "ants")
+# kept back from a deadline for the result to travel back from the worker
+DEADLINE_MARGIN = 0.05
+# deadlines this close together count as equal, so the smaller instance of them goes first
+DEADLINE_BUCKET = 0.25
+MAX_CACHED_INSTANCES = 16
+
+
+def instance_key(payload):
+    if "text" in payload:
+        content = payload["text"]
+    else:
+        content = json.dumps({key: value for key, value in payload.items() if key != "name"}, sort_keys=True)
+    return hashlib.sha1(content.encode()).hexdigest()
+
+
+def payload_dimension(payload):
+    if "text" in payload:
+        match = re.search(r"^\s*DIMENSION\s*:\s*(\d+)", payload["text"], re.MULTILINE)
+        if match is None:
+            raise ValueError("Instance text has no DIMENSION")
+        return int(match.group(1))
+    return len(payload["coords"])
+
+
+def parse_instance(payload):
+    # vrplib text, or JSON with coords, demands and capacity where the first node is the depot
+    if "text" in payload:
+        instance = vrplib.parse.parse_vrplib(payload["text"], compute_edge_weights=False)
+    else:
+        instance = {
+            "name": payload.get("name", "request"),
+            "dimension": len(payload["coords"]),
+            "capacity": payload["capacity"],
+            "node_coord": np.array(payload["coords"], dtype=float),
+            "demand": np.array(payload["demands"]),
+        }
+        if "n_vehicles" in payload:
+            instance["n_vehicles"] = payload["n_vehicles"]
+
+    if "edge_weight" not in instance:
+        instance["edge_weight"] = compute_distances(instance["node_coord"], symmetric=True)
+    instance["depot"] = np.array([0])
+    return instance
+
+
+# lives in every worker process, instances stay parsed with their distance matrix between requests
+_instances = OrderedDict()
+
+
+def warm_up():
+    return os.getpid()
+
+
+def cached_instance(key, payload):
+    if key in _instances:
+        _instances.move_to_end(key)
+        return _instances[key]
+
+    instance = _instances[key] = as_instance(parse_instance(payload))
+    if len(_instances) > MAX_CACHED_INSTANCES:
+        _instances.popitem(last=False)
+    return instance
+
+
+def solve_job(key, payload, solver, params, budget, seed):
+    start = time.perf_counter()
+    instance = cached_instance(key, payload)
+    budget = max(0.0, budget - (time.perf_counter() - start))
+
+    incumbent = None
+    if solver == "alns":
+        np.random.seed(seed)
+        alns = CVRPALNS(**dict(DEFAULT_PARAMS["alns"], **params))
+        for incumbent in alns.iter_solve(instance, deadline=budget):
+            pass
+    else:
+        sim = AntsSimulator(dict(DEFAULT_PARAMS["ants"], **params, seed=seed))
+        for incumbent in sim.iter_simulate(instance, deadline=budget):
+            pass
+
+    if incumbent is None:
+        return {"status": "expired", "worker": os.getpid()}
+    return {
+        "status": "ok",
+        "cost": float(incumbent.cost),
+        "routes": [[int(node) for node in route] for route in incumbent.routes],
+        "elapsed": time.perf_counter() - start,
+        "iteration": incumbent.iteration,
+        "worker": os.getpid(),
+    }
+
+
+class Job:
+    def __init__(self, payload, solver, deadline, params, seed):
+        self.key = instance_key(payload)
+        self.dimension = payload_dimension(payload)
+        self.payload = payload
+        self.solver = solver
+        self.deadline = deadline
+        self.params = params
+        self.seed = seed
+        self.future = asyncio.get_running_loop().create_future()
+
+
+class SolverService:
+
+    def __init__(self, workers=None):
+        self.n_workers = workers if workers is not None else os.cpu_count()
+        # one single-process pool per worker, so a job can be sent to the worker that already holds its instance
+        self.executors = []
+        self.cached_keys = []
+        self.free = None
+        self.jobs = []
+        self.counter = itertools.count()
+        self.scheduled = None
+        self.scheduler = None
+        self.running = set()
+
+    async def start(self):
+        loop = asyncio.get_running_loop()
+        self.executors = [ProcessPoolExecutor(max_workers=1) for _ in range(self.n_workers)]
+        self.cached_keys = [OrderedDict() for _ in range(self.n_workers)]
+        await asyncio.gather(*(loop.run_in_executor(executor, warm_up) for executor in self.executors))
+
+        self.free = set(range(self.n_workers))
+        self.scheduled = asyncio.Event()
+        self.scheduler = asyncio.create_task(self.schedule())
+        return self
+
+    async def stop(self):
+        if self.scheduler is not None:
+            self.scheduler.cancel()
+            await asyncio.gather(self.scheduler, return_exceptions=True)
+        # queued jobs never reach a worker, their callers get an error instead of waiting forever
+        for _, _, _, job in self.jobs:
+            if not job.future.done():
+                job.future.set_exception(RuntimeError("Solver service stopped"))
+        self.jobs.clear()
+        await asyncio.gather(*self.running, return_exceptions=True)
+        for executor in self.executors:
+            executor.shutdown()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.stop()
+
+    async def solve(self, payload, solver="alns", deadline=10.0, params=None, seed=0):
+        if solver not in SOLVERS:
+            raise ValueError(f"Unknown solver {solver}, expected one of {SOLVERS}")
+
+        job = Job(payload, solver, time.monotonic() + deadline, params or {}, seed)
+        # earliest deadline first by buckets, smaller instances first within a bucket
+        heapq.heappush(self.jobs, (job.deadline // DEADLINE_BUCKET, job.dimension, next(self.counter), job))
+        self.scheduled.set()
+        try:
+            return await asyncio.wait_for(job.future, deadline)
+        except asyncio.TimeoutError:
+            return {"status": "expired"}
+
+    def pick_worker(self, job):
+        for worker_idx in self.free:
+            if job.key in self.cached_keys[worker_idx]:
+                return worker_idx
+        return min(self.free)
+
+    async def schedule(self):
+        while True:
+            await self.scheduled.wait()
+            self.scheduled.clear()
+
+            while self.jobs and self.free:
+                _, _, _, job = heapq.heappop(self.jobs)
+                if job.future.done():
+                    continue
+                # waited past its deadline in the queue, a worker could not return anything in time
+                if job.deadline - time.monotonic() <= DEADLINE_MARGIN:
+                    job.future.set_result({"status": "expired"})
+                    continue
+
+                worker_idx = self.pick_worker(job)
+                self.free.remove(worker_idx)
+                task = asyncio.create_task(self.run(worker_idx, job))
+                self.running.add(task)
+                task.add_done_callback(self.running.discard)
+
+    async def run(self, worker_idx, job):
+        loop = asyncio.get_running_loop()
+        cached_keys = self.cached_keys[worker_idx]
+        cached_keys[job.key] = True
+        cached_keys.move_to_end(job.key)
+        if len(cached_keys) > MAX_CACHED_INSTANCES:
+            cached_keys.popitem(last=False)
+
+        budget = job.deadline - time.monotonic() - DEADLINE_MARGIN
+        try:
+            result = await loop.run_in_executor(
+                self.executors[worker_idx], solve_job, job.key, job.payload, job.solver, job.params, budget, job.seed)
+            if not job.future.done():
+                job.future.set_result(result)
+        except Exception as exc:
+            if not job.future.done():
+                job.future.set_exception(exc)
+        finally:
+            self.free.add(worker_idx)
+            self.scheduled.set()
+
+
+class LocalClient:
+    # talks to a service in the same event loop, no sockets or serialisation
+    def __init__(self, service):
+        self.service = service
+
+    async def solve(self, payload, solver="alns", deadline=10.0, params=None, seed=0):
+        return await self.service.solve(payload, solver, deadline, params, seed)
+
+    async def solve_file(self, path, solver="alns", deadline=10.0, params=None, seed=0):
+        with open(path) as fp:
+            return await self.solve({"text": fp.read()}, solver, deadline, params, seed)
+
+
+async def handle_connection(service, reader, writer):
+    # one JSON request per line: {"instance": {...}, "solver": ..., "deadline": ..., "params": ..., "seed": ...}
+    while line := await reader.readline():
+        try:
+            request = json.loads(line)
+            response = await service.solve(request["instance"], request.get("solver", "alns"),
+                                           request.get("deadline", 10.0), request.get("params"),
+                                           request.get("seed", 0))
+        except Exception as exc:
+            response = {"status": "error", "error": str(exc)}
+        writer.write(json.dumps(response).encode() + b"\n")
+        await writer.drain()
+    writer.close()
+
+
+async def serve(host="127.0.0.1", port=8765, workers=None):
+    async with SolverService(workers) as service:
+        server = await asyncio.start_server(
+            lambda reader, writer: handle_connection(service, reader, writer), host, port)
+        async with server:
+            await server.serve_forever()
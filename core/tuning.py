@@ -0,0 +1,87 @@
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from core.parallel import solve_ants, task_seed, task_source
+
+
+def configurations(grid):
+    keys = sorted(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*(grid[key] for key in keys))]
+
+
+# best-cost histories by (instance, params, seed), a run of n iterations also answers
+# every shorter budget, since its first iterations are the same for the same seed
+class TuningCache:
+
+    def __init__(self, path=None):
+        self.path = path
+        self.histories = {}
+        if path is not None and os.path.exists(path):
+            with open(path) as fp:
+                self.histories = json.load(fp)
+
+    def key(self, task, params, seed):
+        params = {key: value for key, value in params.items() if key not in ("max_iterations", "runs")}
+        return json.dumps({"instance": task.name.strip(), "params": params, "seed": seed}, sort_keys=True)
+
+    def get(self, task, params, seed, n_iterations):
+        history = self.histories.get(self.key(task, params, seed))
+        if history is None or len(history) < n_iterations:
+            return None
+        return history[:n_iterations]
+
+    def put(self, task, params, seed, history):
+        key = self.key(task, params, seed)
+        if len(history) > len(self.histories.get(key, [])):
+            self.histories[key] = [float(cost) for cost in history]
+
+    def save(self):
+        if self.path is None:
+            return
+        with open(self.path, "w") as fp:
+            json.dump(self.histories, fp)
+
+
+def evaluate(task, configs, fraction, min_iterations, seed, cache, executor):
+    source = task_source(task)
+    jobs = {}
+    for config_idx, config in enumerate(configs):
+        n_iterations = max(min_iterations, int(config["max_iterations"] * fraction))
+        params = dict(config, max_iterations=n_iterations)
+        for run in range(config["runs"]):
+            run_seed = task_seed(seed, run)
+            if cache.get(task, params, run_seed, n_iterations) is None:
+                jobs[(config_idx, run)] = (params, run_seed, executor.submit(solve_ants, source, params, run_seed))
+
+    for params, run_seed, future in jobs.values():
+        cache.put(task, params, run_seed, future.result()[0])
+    cache.save()
+
+    scores = []
+    for config in configs:
+        n_iterations = max(min_iterations, int(config["max_iterations"] * fraction))
+        params = dict(config, max_iterations=n_iterations)
+        costs = [cache.get(task, params, task_seed(seed, run), n_iterations)[-1] for run in range(config["runs"])]
+        scores.append(np.mean(costs))
+    return np.array(scores)
+
+
+def tune(task, grid, workers=None, eta=3, min_iterations=10, cache_path=None, seed=0):
+    configs = configurations(grid)
+    cache = TuningCache(cache_path)
+
+    # successive halving, every round keeps the best 1 / eta of the configurations at eta times the budget
+    n_rounds = int(np.ceil(np.log(len(configs)) / np.log(eta))) + 1 if len(configs) > 1 else 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for round_idx in range(n_rounds):
+            fraction = float(eta) ** (round_idx - n_rounds + 1)
+            scores = evaluate(task, configs, fraction, min_iterations, seed, cache, executor)
+            order = np.argsort(scores, kind="stable")
+            if round_idx + 1 < n_rounds:
+                configs = [configs[idx] for idx in order[:max(1, len(configs) // eta)]]
+
+    return scores[order[0]], configs[order[0]]
@@ -1,6 +1,7 @@
 import os
 from constants import LOCAL_DIR
-from core.cvrp import params_optimization, get_task
+from core.cvrp import get_task
+from core.tuning import tune
 
 
 params_grid = {
@@ -16,6 +17,8 @@ params_grid = {
     "runs": [5]
 }
 
-task = get_task(os.path.join(LOCAL_DIR, "resources/A/A-n32-k5.vrp"))
-cost, params = params_optimization(task, params_grid)
-print(cost, params)
\ No newline at end of file
+if __name__ == "__main__":
+    task = get_task(os.path.join(LOCAL_DIR, "resources/A/A-n32-k5.vrp"))
+    cost, params = tune(task, params_grid, workers=os.cpu_count(),
+                        cache_path=os.path.join(LOCAL_DIR, "resources", "tuning_A-n32-k5.json"))
+    print(cost, params)
\ No newline at end of file
@@ -2,12 +2,16 @@ import os
 import json
 import glob
 
-import vrplib
 from constants import LOCAL_DIR
 from core.cvrp import get_solution
 from tqdm import tqdm
 
 from core.cvrp_alns import custom_alns_solver
+from core.parallel import run_alns_parallel
+from vrp_io.cache import load_instance
+
+
+WORKERS = os.cpu_count()
 
 
 def run_alns(solver, path):
@@ -17,8 +21,8 @@ def run_alns(solver, path):
     sols_path = glob.glob(os.path.join(path, '*' + ".sol"))
 
     for task_path, sol_path in tqdm(zip(sorted(tasks_path), sorted(sols_path))):
-        task_name = task_path.rsplit("/", 1)[1].strip(".vrp")
-        data = vrplib.read_instance(task_path)
+        task_name = os.path.splitext(os.path.basename(task_path))[0]
+        data = load_instance(task_path)
         optimal = get_solution(sol_path).cost
         history[task_name] = {}
 
@@ -39,6 +43,7 @@ def save_history(history, path):
         json.dump(history, fp, indent=4)
 
 
-for task_type in ['A', 'B', 'E']:
-    hist = run_alns(custom_alns_solver, os.path.join(LOCAL_DIR, "resources", task_type))
-    save_history(hist, os.path.join(LOCAL_DIR, "resources", f"result_{task_type}_custom.json"))
\ No newline at end of file
+if __name__ == "__main__":
+    for task_type in ['A', 'B', 'E']:
+        hist = run_alns_parallel(custom_alns_solver, os.path.join(LOCAL_DIR, "resources", task_type), workers=WORKERS)
+        save_history(hist, os.path.join(LOCAL_DIR, "resources", f"result_{task_type}_custom.json"))
\ No newline at end of file
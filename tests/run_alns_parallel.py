@@ -0,0 +1,17 @@
+import os
+from constants import LOCAL_DIR
+from core.cvrp import get_solution
+from core.cvrp_alns_parallel import ParallelCVRPALNS
+from vrp_io.cache import load_instance
+
+
+if __name__ == "__main__":
+    data = load_instance(os.path.join(LOCAL_DIR, "resources/A/A-n32-k5.vrp"))
+    optimal = get_solution(os.path.join(LOCAL_DIR, "resources/A/A-n32-k5.sol")).cost
+
+    alns = ParallelCVRPALNS(0.02, 0.0, 6000, 500, 10, n_workers=2)
+    solution = alns(data)
+
+    customers = sorted(customer for route in solution.routes for customer in route)
+    assert customers == list(range(1, data["dimension"])), "every customer must be served exactly once"
+    print(solution.cost, optimal, solution.get_time())
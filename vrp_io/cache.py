@@ -0,0 +1,71 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from core.distances import compute_distances
+from vrp_io.reader import read_vrp
+
+
+CACHE_DIR_NAME = ".cache"
+ARRAYS = ("node_coord", "demand", "edge_weight")
+
+
+def instance_key(path: str) -> str:
+    with open(path, "rb") as f:
+        digest = hashlib.sha1(f.read()).hexdigest()
+    stamp = f"{os.path.abspath(path)}|{os.stat(path).st_mtime_ns}|{digest}"
+    return hashlib.sha1(stamp.encode()).hexdigest()[:16]
+
+
+def build_instance(path: str, rounding: bool = False, distances: str = "dense") -> dict:
+    task = read_vrp(path)
+    instance = {key: task[key] for key in ("name", "comment", "type", "dimension", "capacity", "edge_weight_type")
+                if key in task}
+    if "nodes" in task:
+        instance["node_coord"] = task["nodes"][:, 1:]
+    instance["demand"] = task["nodes_demand"][:, 1]
+    # other backends are built from the coordinates by the task, their full matrix is never written
+    if "edge_weight" in task:
+        instance["edge_weight"] = task["edge_weight"]
+    elif distances == "dense":
+        instance["edge_weight"] = compute_distances(instance["node_coord"], symmetric=True, rounding=rounding)
+    return instance
+
+
+def load_instance(path: str, cache_dir: str = None, rounding: bool = False, distances: str = "dense") -> dict:
+    if not os.path.exists(path):
+        raise FileNotFoundError(path)
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+    name = os.path.basename(path).rsplit(".", 1)[0]
+    suffix = ("-rounded" if rounding else "") + ("" if distances == "dense" else "-coords")
+    entry = os.path.join(cache_dir, f"{name}-{instance_key(path)}{suffix}")
+
+    if not os.path.exists(os.path.join(entry, "meta.json")):
+        instance = build_instance(path, rounding, distances)
+        os.makedirs(cache_dir, exist_ok=True)
+
+        # write into a temporary directory and move it in place, so concurrent workers never see a partial entry
+        tmp = tempfile.mkdtemp(dir=cache_dir)
+        for key in ARRAYS:
+            if key in instance:
+                np.save(os.path.join(tmp, f"{key}.npy"), instance[key])
+        with open(os.path.join(tmp, "meta.json"), "w") as fp:
+            json.dump({key: value for key, value in instance.items() if not isinstance(value, np.ndarray)}, fp)
+        try:
+            os.rename(tmp, entry)
+        except OSError:
+            shutil.rmtree(tmp)
+
+    with open(os.path.join(entry, "meta.json")) as fp:
+        instance = json.load(fp)
+    for key in ARRAYS:
+        if os.path.exists(os.path.join(entry, f"{key}.npy")):
+            instance[key] = np.load(os.path.join(entry, f"{key}.npy"), mmap_mode="r")
+    instance["depot"] = np.array([0])
+    return instance
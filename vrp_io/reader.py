@@ -1,50 +1,139 @@
+import gzip
+import itertools
 import os.path
 
+import numpy as np
+
+
+ROWS_CHUNK = 4096
+
+
+def open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt")
+    return open(path)
+
+
+def read_numbers(lines, count: int, dtype=float) -> np.ndarray:
+    # numbers may wrap over lines arbitrarily, so rows are read until enough values came in
+    chunks = []
+    n_read = 0
+    for line in lines:
+        values = np.fromstring(line, dtype=dtype, sep=" ")
+        chunks.append(values)
+        n_read += len(values)
+        if n_read >= count:
+            break
+
+    if n_read != count:
+        raise Exception(f"Expected {count} values in a section, got {n_read}")
+    return np.concatenate(chunks) if chunks else np.empty(0, dtype=dtype)
+
+
+def read_rows(lines, n_rows: int, dtype=float) -> np.ndarray:
+    # rows are parsed by chunks into one array, separators may be any mix of spaces and tabs
+    out = None
+    n_read = 0
+    while n_read < n_rows:
+        rows = list(itertools.islice(lines, min(ROWS_CHUNK, n_rows - n_read)))
+        if not rows:
+            raise ValueError(f"section ended after {n_read} of {n_rows} rows")
+        values = np.fromstring(" ".join(rows), dtype=dtype, sep=" ")
+        if len(values) % len(rows) != 0 or (out is not None and len(values) != len(rows) * out.shape[1]):
+            raise Exception("Section rows have different lengths")
+        if out is None:
+            out = np.empty((n_rows, len(values) // len(rows)), dtype=dtype)
+        out[n_read:n_read + len(rows)] = values.reshape(len(rows), -1)
+        n_read += len(rows)
+
+    if out is None:
+        raise Exception("Section rows have different lengths")
+    return out
+
+
+def edge_weight_count(edge_weight_format: str, dimension: int) -> int:
+    counts = {
+        "FULL_MATRIX": dimension * dimension,
+        "LOWER_ROW": dimension * (dimension - 1) // 2,
+        "UPPER_ROW": dimension * (dimension - 1) // 2,
+        "LOWER_DIAG_ROW": dimension * (dimension + 1) // 2,
+        "UPPER_DIAG_ROW": dimension * (dimension + 1) // 2,
+    }
+    if edge_weight_format not in counts:
+        raise Exception(f"Unsupported EDGE_WEIGHT_FORMAT {edge_weight_format}")
+    return counts[edge_weight_format]
+
+
+def edge_weight_matrix(values: np.ndarray, edge_weight_format: str, dimension: int) -> np.ndarray:
+    if edge_weight_format == "FULL_MATRIX":
+        return values.reshape(dimension, dimension)
+
+    matrix = np.zeros((dimension, dimension), dtype=values.dtype)
+    diagonal = 0 if edge_weight_format.endswith("DIAG_ROW") else 1
+    if edge_weight_format.startswith("LOWER"):
+        rows, cols = np.tril_indices(dimension, -diagonal)
+    else:
+        rows, cols = np.triu_indices(dimension, diagonal)
+    matrix[rows, cols] = values
+    matrix[cols, rows] = values
+    return matrix
+
 
 def read_vrp(path: str) -> dict:
     if not os.path.exists(path):
         raise FileNotFoundError(path)
 
-    lines = None
-    with open(path) as f:
-        lines = f.readlines()
+    solution_dict = {}
+    with open_text(path) as f:
+        # the file is consumed as a stream, sections pull their rows from the same iterator
+        lines = iter(f)
+        for line in lines:
+            line = line.strip()
+            if not line or line == "EOF":
+                continue
 
-    if not lines:
-        raise Exception(f"Task from {path} has incorrect inner format")
+            key, _, value = line.partition(":")
+            key, value = key.strip(), value.strip()
+
+            if key == "NAME":
+                solution_dict["name"] = value
+            elif key == "COMMENT":
+                solution_dict["comment"] = value
+            elif key == "TYPE":
+                solution_dict["type"] = value
+            elif key == "DIMENSION":
+                solution_dict["dimension"] = int(value)
+            elif key == "CAPACITY":
+                solution_dict["capacity"] = int(value)
+            elif key == "EDGE_WEIGHT_TYPE":
+                solution_dict["edge_weight_type"] = value
+            elif key == "EDGE_WEIGHT_FORMAT":
+                solution_dict["edge_weight_format"] = value
+            elif key.endswith("_SECTION") and key != "DEPOT_SECTION":
+                if "dimension" not in solution_dict:
+                    raise Exception(f"Task from {path} has incorrect inner format")
+                dimension = solution_dict["dimension"]
 
-    solution_dict = {"nodes": [], "nodes_demand": []}
-    index = 0
-    while index < len(lines):
-        line = lines[index]
-        if line.startswith("NAME"):
-            solution_dict["name"] = line.rsplit(":")[1].rstrip()
-        elif line.startswith("COMMENT"):
-            solution_dict["comment"] = line.rsplit(":")[1].rstrip()
-        elif line.startswith("DIMENSION"):
-            solution_dict["dimension"] = int(line.rsplit(":")[1].rstrip())
-        elif line.startswith("CAPACITY"):
-            solution_dict["capacity"] = int(line.rsplit(":")[1].rstrip())
-        elif line.startswith("NODE_COORD_SECTION"):
-            if "dimension" not in solution_dict:
-                raise Exception(f"Task from {path} has incorrect inner format")
-            dimension = solution_dict["dimension"]
-            for node_index in range(dimension):
-                index += 1
-                line = lines[index]
-                node_number, node_x, node_y = map(int, line.strip().split(" "))
-                solution_dict["nodes"].append([node_number, node_x, node_y])
-        elif line.startswith("DEMAND_SECTION"):
-            if "dimension" not in solution_dict:
-                raise Exception(f"Task from {path} has incorrect inner format")
-            dimension = solution_dict["dimension"]
-            for node_index in range(dimension):
-                index += 1
-                line = lines[index]
-                node_number, node_demand = map(int, line.strip().split(" "))
-                solution_dict["nodes_demand"].append([node_number, node_demand])
-
-        index += 1
+                if key == "NODE_COORD_SECTION":
+                    solution_dict["nodes"] = read_rows(lines, dimension)
+                elif key == "DEMAND_SECTION":
+                    solution_dict["nodes_demand"] = read_rows(lines, dimension, dtype=int)
+                elif key == "EDGE_WEIGHT_SECTION":
+                    edge_weight_format = solution_dict.get("edge_weight_format", "FULL_MATRIX")
+                    values = read_numbers(lines, edge_weight_count(edge_weight_format, dimension))
+                    solution_dict["edge_weight"] = edge_weight_matrix(values, edge_weight_format, dimension)
+            elif key == "DEPOT_SECTION":
+                depots = []
+                for depot_line in lines:
+                    depot = int(depot_line.strip())
+                    if depot == -1:
+                        break
+                    depots.append(depot - 1)
+                solution_dict["depot"] = np.array(depots)
+            # rows of unknown sections, e.g. DISPLAY_DATA_SECTION, fall through here and are skipped
 
+    if "dimension" not in solution_dict or "nodes_demand" not in solution_dict:
+        raise Exception(f"Task from {path} has incorrect inner format")
     return solution_dict
 
 
@@ -52,24 +141,16 @@ def read_solution(path: str) -> dict:
     if not os.path.exists(path):
         raise FileNotFoundError(path)
 
-    lines = None
-    with open(path) as f:
-        lines = f.readlines()
-
-    if not lines:
-        raise Exception(f"Solution from {path} has incorrect inner format")
-
-    route_index = 0
     solution_dict = {"routes": [], "cost": float("inf")}
-    for line in lines:
-        if line.startswith("Route"):
-            route = line.rsplit(":", 1)[1]
-            route_list = list(map(lambda x: int(x), route.strip().split(' ')))
-
-            solution_dict["routes"].append(route_list)
-            route_index += 1
-        elif line.startswith("Cost"):
-            cost = line.strip().rsplit(" ")[1]
-            solution_dict["cost"] = int(cost)
+    with open_text(path) as f:
+        for line in f:
+            if line.startswith("Route"):
+                route = line.split(":", 1)[1]
+                solution_dict["routes"].append(np.fromstring(route, dtype=int, sep=" "))
+            elif line.startswith("Cost"):
+                cost = line.split()[1]
+                solution_dict["cost"] = float(cost) if "." in cost else int(cost)
 
+    if not solution_dict["routes"]:
+        raise Exception(f"Solution from {path} has incorrect inner format")
     return solution_dict